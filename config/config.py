@@ -9,6 +9,10 @@ class BGVDefaults:
     LAMBDA_SECURITY: int = 128
     PLAINTEXT_MODULUS: int = 7
     BASE: int = 5
+    MODULUS_LEVELS: int = 2
+    KEY_SWITCHING: str = "base"   # "base" = base decomposition, "hybrid" = special prime P
+    HYBRID_DIGITS: int = 1        # Digits of c2 in hybrid key switching
+    BALANCED_DIGITS: bool = True  # Signed digits in [-base/2, base/2) for relinearization
     
     LAMBDA_OPTIONS: List[str] = None
     
@@ -57,6 +61,7 @@ class UITexts:
     PARAM_LAMBDA: str = "Параметър за сигурност (λ):"
     PARAM_T: str = "Модул на явното съобщение (t):"
     PARAM_BASE: str = "База за релинеаризация:"
+    PARAM_LEVELS: str = "Нива на модула (L):"
     PARAM_Q: str = "Модул на криптираните съобщения (q):"
     PARAM_Q_AUTO: str = "Автоматично от λ"
     
@@ -69,6 +74,7 @@ class UITexts:
     
     CURR_CRYPTOGRAM: str = "Текуща криптограма:"
     VALUES_INPUT: str = "Стойности (разделени със запетая):"
+    PLANNED_DEPTH: str = "Планирана дълбочина (умножения, празно = максимална):"
     
     # Buttons
     BTN_GENERATE_KEYS: str = "Генерирай ключове"
@@ -88,6 +94,7 @@ class UITexts:
     STATUS_INVALID_PARAMS: str = "Невалидни параметри."
     STATUS_COMPATIBILITY_ERROR: str = "Грешка при съвместимост!"
     STATUS_GENERATION_ERROR: str = "Грешка при генериране!"
+    STATUS_SEARCHING: str = "Търсене на модул..."
 
 
 @dataclass
@@ -108,7 +115,11 @@ class ValidationRules:
     
     # Base
     BASE_MIN: int = 2
-    BASE_MAX: int = 10
+    BASE_MAX: int = 1 << 16
+    
+    # Modulus chain levels
+    LEVELS_MIN: int = 2
+    LEVELS_MAX: int = 8
     
     # Coefficient modulus bits
     COEF_BITS_MIN: int = 32
@@ -120,17 +131,63 @@ class ValidationRules:
 class NoiseManagement:
     #Noise management
     
-    # Modulus switching limits
-    SWITCHING_THRESHOLD: int = 40
-    CRITICAL_THRESHOLD_OFFSET: int = 40
-    WARNING_THRESHOLD_OFFSET: int = 45
+    # "scheduled" = switch both operands of a product where it gains noise budget,
+    # "threshold" = ratio rule before and after every operation
+    SWITCHING_POLICY: str = "scheduled"
+    SWITCHING_MIN_GAIN_BITS: int = 10  # Budget a scheduled switch one level deeper must gain
+    SWITCHING_MARGIN_BITS: int = 10    # Distance a held product must keep below the critical threshold
     
-    SWITCHING_THRESHOLD_PERCENT: float = 40.0
-    CRITICAL_THRESHOLD_PERCENT: float = 60.0
+    # Noise thresholds in bits, as fractions of the bits of q/2 (fallback of the scheduler)
+    SWITCHING_RATIO: float = 0.63      # Modulus switching
+    WARNING_RATIO: float = 0.75        # Warning
+    CRITICAL_RATIO: float = 0.85       # Operation blocked
+    THRESHOLD_GAP_BITS: int = 10       # Minimal distance between consecutive thresholds
     
     # Maximal attempts
     MAX_SWITCHING_ATTEMPTS: int = 50
     MAX_MODULUS_ATTEMPTS: int = 100
+    
+    # Encrypt at the lowest level that supports the planned multiplicative depth
+    ENCRYPT_AT_PLANNED_LEVEL: bool = True
+    PLANNING_MARGIN_BITS: int = 10     # Distance planned steps must keep below the critical threshold
+    
+    # Keep products unrelinearized until a multiplication or switching needs them
+    LAZY_RELINEARIZATION: bool = True
+    
+    # Decrypt before and after every modulus switch and compare (debug only, needs sk)
+    VERIFY_SWITCHING: bool = False
+    
+    # Noise tracking: "heuristic" or "worst_case" closed-form bounds, "measure" = decrypt with sk
+    NOISE_ESTIMATION: str = "heuristic"
+    
+    # Noise checks without a tracked bound sample this many coefficients (0 = all of them)
+    NOISE_SAMPLES: int = 64
+    NOISE_SAMPLING_FAILURE: float = 1e-6   # Probability that the sampled bound is too low
+
+
+@dataclass
+class ParameterGeneration:
+    # Modulus search settings
+    
+    # Worker processes, 0 = one per CPU core. 1 = single process: for the offered λ the first
+    # sieve window holds a prime and the search takes milliseconds, less than dispatching it
+    SEARCH_WORKERS: int = 1
+    SEARCH_TIMEOUT: float = 120.0      # Seconds before key generation gives up
+    SEARCH_POLL_MS: int = 50           # How often the GUI checks the running search
+    
+    USE_PARAMETER_CACHE: bool = True   # Reuse vetted moduli stored on disk
+    PARAMETER_CACHE_DIR: str = ""      # Empty = ~/.bgvision/parameter_cache
+    
+    PRECOMPUTE_KEY_MATERIAL: bool = True  # Build per-level relinearization keys in the background
+
+
+@dataclass
+class RelinearizationSettings:
+    # Parallel relinearization settings
+    
+    PARALLEL_WORKERS: int = 1          # 1 = sequential, 0 = one worker per CPU core
+    PARALLEL_EXECUTOR: str = "process" # "process" (keys in shared memory) or "thread"
+    PARALLEL_MIN_DIGITS: int = 8       # Fewer digits are relinearized sequentially
 
 
 class ParameterDescriptions:
@@ -163,11 +220,20 @@ class ParameterDescriptions:
     BASE_DESCRIPTION = """База за релинеаризация:
 
 • Използва се за оптимизация на умножението.
-• Препоръчителни стойности: 3-10.
-• По-малка база = по-бавна релинеризация.
-• По-голяма база = повече памет за релинизиращи ключове.
-• Обикновено 3-5 е добър избор.
-• Максимална стойност: 10."""
+• По-малка база = повече цифри и по-бавна релинеаризация.
+• По-голяма база = по-малко ключове, но повече шум при релинеаризация.
+• Степените на двойката (16, 256, 65536) се разлагат с побитови операции.
+• „auto" - базата се избира от модел на разходите (време, памет и шум).
+• Максимална стойност: 65536."""
+
+    LEVELS_DESCRIPTION = """Нива на модула (L):
+
+• Брой нива във веригата от модули q₀ > q₁ > ... > q_(L-1).
+• Всяко modulus switching сваля криптограмата едно ниво надолу.
+• L = 2 - класическата двойка голям/малък модул.
+• При L > 2 модулите са произведения на прости числа q ≡ 1 (mod 2n) и q ≡ 1 (mod t).
+• Повече нива = повече последователни умножения, но по-малко бита на ниво.
+• Максимална стойност: 8."""
 
     N_INFO_SHORT = "🔹 Степен на полинома (n): Определя размера на векторите за криптиране.\n   • Числото трябва да е степен на двойката (4, 8, 16, 32, 64, 128).\n   • По-голяма стойност = повече сигурност, но по-бавни операции.\n   • Препоръчително: 16-32 за демонстрация на работата на схемата, 64-128 за по-сложни операции.\n   • Максимална стойност: 128."
 
@@ -175,7 +241,9 @@ class ParameterDescriptions:
 
     T_INFO_SHORT = "🔹 Модул на явното съобщение (t): Определя пространството на некриптираните съобщения.\n   • Диапазон на стойностите във вектора за криптиране: от 0 до t-1.\n   • t трябва да е просто число (2, 3, 5, 7, 11, 13...).\n   • Малки стойности (2-31) са добри за демонстрация на работата на схемата.\n   • По-големи стойности позволяват съхранението на повече данни."
 
-    BASE_INFO_SHORT = "🔹 База за релинеаризация: Използва се за оптимизация на умножението.\n   • Препоръчителни стойности: от 3 до 10.\n   • По-малка база = по-бавна операция по релинеаризиране.\n   • По-голяма база = повече памет за релинеаризиращи ключове.\n   • Максимална стойност: 10."
+    BASE_INFO_SHORT = "🔹 База за релинеаризация: Използва се за оптимизация на умножението.\n   • По-малка база = по-бавна операция по релинеаризиране.\n   • По-голяма база = по-малко ключове, но повече шум.\n   • „auto\" избира базата по модел на разходите.\n   • Максимална стойност: 65536."
+
+    LEVELS_INFO_SHORT = "🔹 Нива на модула (L): Брой нива във веригата от модули.\n   • Всяко modulus switching сваля криптограмата едно ниво надолу.\n   • L = 2 е класическата двойка голям/малък модул.\n   • Повече нива позволяват по-дълбоки изчисления.\n   • Максимална стойност: 8."
 
     Q_INFO_SHORT = "🔹 Модул на криптираните съобщения (q): Определя ciphertext space - пространството на криптираните съобщения. \n   Автоматично се изчислява въз основа на λ за оптимална сигурност."
 
@@ -187,6 +255,7 @@ class HelpTexts:
     HELP_LAMBDA: str = ParameterDescriptions.LAMBDA_DESCRIPTION  
     HELP_T: str = ParameterDescriptions.T_DESCRIPTION
     HELP_BASE: str = ParameterDescriptions.BASE_DESCRIPTION
+    HELP_LEVELS: str = ParameterDescriptions.LEVELS_DESCRIPTION
 
 
 @dataclass
@@ -228,6 +297,8 @@ class ParameterInfo:
 
 {ParameterDescriptions.BASE_INFO_SHORT}
 
+{ParameterDescriptions.LEVELS_INFO_SHORT}
+
 {ParameterDescriptions.Q_INFO_SHORT}
 
 ⚙️ ВРЪЗКА λ → q: q ≈ 2^(λ + log₂(n)) за постигане на λ-битова сигурност.
@@ -256,6 +327,8 @@ class Config:
         self.ui_texts = UITexts()
         self.validation = ValidationRules()
         self.noise = NoiseManagement()
+        self.generation = ParameterGeneration()
+        self.relinearization = RelinearizationSettings()
         self.help = HelpTexts()
         self.welcome = WelcomeMessage()
         self.param_info = ParameterInfo()
@@ -273,6 +346,10 @@ class Config:
     def validate_power_of_two(self, n):
         return n > 0 and (n & (n - 1)) == 0
     
+    def get_search_workers(self):
+        # Number of worker processes for the modulus search, None = one per CPU core
+        return self.generation.SEARCH_WORKERS or None
+    
     def get_suggested_coef_bits(self, lambda_security, n):
         import math
         log_n = math.log2(n)
@@ -285,6 +362,6 @@ config = Config()
 # Export
 __all__ = [
     'Config', 'BGVDefaults', 'AppSettings', 'UITexts', 'ValidationRules',
-    'NoiseManagement', 'HelpTexts', 'WelcomeMessage', 'ParameterInfo', 
+    'NoiseManagement', 'ParameterGeneration', 'RelinearizationSettings', 'HelpTexts', 'WelcomeMessage', 'ParameterInfo', 
     'ParameterDescriptions', 'config'
 ]
\ No newline at end of file
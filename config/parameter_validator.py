@@ -1,5 +1,7 @@
 import numpy as np
 
+from config.config import config
+
 
 def is_prime(n):
     # Check if a number is prime
@@ -15,7 +17,12 @@ def is_prime(n):
     return True
 
 
-def validate_bgv_parameters(n, lambda_security, plaintext_modulus, base):
+def is_auto_base(base):
+    # The base field accepts "auto" to let the cost model choose
+    return isinstance(base, str) and base.strip().lower() in ("auto", "авто")
+
+
+def validate_bgv_parameters(n, lambda_security, plaintext_modulus, base, levels=2):
    # Validate user input parameters for BGV scheme.
     errors = []
     
@@ -54,14 +61,26 @@ def validate_bgv_parameters(n, lambda_security, plaintext_modulus, base):
         errors.append("Модулът на явното съобщение трябва да е цяло число.")
 
     # Validate base
+    rules = config.validation
+    try:
+        if not is_auto_base(base):
+            base = int(base)
+            if base < rules.BASE_MIN:
+                errors.append(f"Базата за релинеаризация трябва да е най-малко {rules.BASE_MIN}.")
+            elif base > rules.BASE_MAX:
+                errors.append(f"Базата за релинеаризация е твърде голяма (максимум {rules.BASE_MAX}).")
+    except (ValueError, TypeError):
+        errors.append("Базата за релинеаризация трябва да е цяло число или \"auto\".")
+
+    # Validate modulus chain levels
     try:
-        base = int(base)
-        if base < 2:
-            errors.append("Базата за релинеаризация трябва да е най-малко 2.")
-        elif base > 10:
-            errors.append("Базата за релинеаризация е твърде голяма (максимум 10).")
+        levels = int(levels)
+        if levels < rules.LEVELS_MIN:
+            errors.append(f"Веригата от модули трябва да има най-малко {rules.LEVELS_MIN} нива.")
+        elif levels > rules.LEVELS_MAX:
+            errors.append(f"Веригата от модули има твърде много нива (максимум {rules.LEVELS_MAX}).")
     except (ValueError, TypeError):
-        errors.append("Базата за релинеаризация трябва да е цяло число.")
+        errors.append("Броят нива на модула трябва да е цяло число.")
 
     return errors
 
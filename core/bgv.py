@@ -2,6 +2,7 @@ import numpy as np
 
 from core.polynomial import (QuotientRingPoly, random_normal_poly,
                         random_ternary_poly, random_uniform_poly)
+from core.utils import infinity_norm
 
 
 def gen_secret_key(coef_modulus: int, poly_modulus: np.ndarray):
@@ -54,24 +55,34 @@ def decrypt(
     return_noise: bool = False,
 ):
     msg = c0 + c1 * sk
-    noise = np.max(np.abs(msg.coef))
-    msg = msg % plaintext_modulus
 
     if return_noise:
-        msg_not_reduced = np.max((c0 + c1 * sk).coef)
-        noise = np.max(np.abs(msg_not_reduced))
-        return msg, noise
+        # Infinity norm of the centered coefficients, taken before the reduction mod t
+        noise = infinity_norm(msg.coef)
+        return msg % plaintext_modulus, noise
     else:
-        return msg
+        return msg % plaintext_modulus
 
 def decrypt_quad(c0, c1, c2, sk, plaintext_modulus, return_noise: bool = False):
     # Evaluate the quadratic equation
-   
-    msg = c0 + c1 * sk + c2 * sk * sk
-    noise = np.max(np.abs(msg.coef))
-    msg = msg % plaintext_modulus
+    return decrypt_ciphertext((c0, c1, c2), sk, plaintext_modulus, return_noise)
+
+def noise_polynomial(ciphertext, sk):
+    # c0 + c1*s + c2*s^2 + ... before the reduction mod t (Horner's rule, one ring product per component)
+    msg = ciphertext[-1]
+    for component in reversed(ciphertext[:-1]):
+        msg = msg * sk + component
+    return msg
+
+def decrypt_ciphertext(ciphertext, sk, plaintext_modulus, return_noise: bool = False):
+    # Decrypt a ciphertext with any number of components: c0 + c1*s + c2*s^2 + ...
+    if len(ciphertext) == 2:
+        return decrypt(ciphertext[0], ciphertext[1], sk, plaintext_modulus, return_noise)
+
+    msg = noise_polynomial(ciphertext, sk)
 
     if return_noise:
-        return msg, noise
+        noise = infinity_norm(msg.coef)
+        return msg % plaintext_modulus, noise
     else:
-        return msg
\ No newline at end of file
+        return msg % plaintext_modulus
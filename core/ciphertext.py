@@ -0,0 +1,68 @@
+import itertools
+
+# Version numbers are unique across all ciphertexts of the process
+_versions = itertools.count(1)
+
+
+class Ciphertext:
+    # Immutable ciphertext (c0, c1[, c2, ...]) with a version number, the tracked noise bound
+    # and a cache of values derived from it (measured noise, plaintext). Every change, e.g.
+    # relinearization or modulus switching, creates a new Ciphertext with a new version,
+    # so cached values never go stale. Behaves like the tuple of its components.
+
+    __slots__ = ('_components', '_version', '_noise_estimate', '_cache')
+
+    def __init__(self, components, noise_estimate=None):
+        object.__setattr__(self, '_components', tuple(components))
+        object.__setattr__(self, '_version', next(_versions))
+        object.__setattr__(self, '_noise_estimate', noise_estimate)
+        object.__setattr__(self, '_cache', {})
+
+    @classmethod
+    def wrap(cls, ciphertext):
+        # Ciphertext objects are returned as they are, tuples are wrapped without an estimate
+        if isinstance(ciphertext, cls):
+            return ciphertext
+        return cls(ciphertext)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Криптограмата не може да бъде променяна.")
+
+    @property
+    def components(self):
+        return self._components
+
+    @property
+    def version(self):
+        return self._version
+
+    @property
+    def noise_estimate(self):
+        # Analytic noise bound, None if not tracked
+        return self._noise_estimate
+
+    @property
+    def coef_modulus(self):
+        return self._components[0].coef_modulus
+
+    def derive(self, components, noise_estimate=None):
+        # New ciphertext (new version) computed from this one
+        return Ciphertext(components, noise_estimate)
+
+    def cached(self, key, compute):
+        # Value of compute() for this version, computed once
+        if key not in self._cache:
+            self._cache[key] = compute()
+        return self._cache[key]
+
+    def __len__(self):
+        return len(self._components)
+
+    def __getitem__(self, index):
+        return self._components[index]
+
+    def __iter__(self):
+        return iter(self._components)
+
+    def __repr__(self):
+        return f"Ciphertext(version={self._version}, components={len(self._components)})"
@@ -1,126 +1,91 @@
 import math
+from functools import lru_cache
 
 import numpy as np
 
 from core.polynomial import QuotientRingPoly
+from core.utils import mod_center
 
 
-def extended_gcd(a, b):
-    # Extended Euclidean algorithm to find gcd and coefficients
-    if a == 0:
-        return b, 0, 1
-    gcd, x1, y1 = extended_gcd(b % a, a)
-    x = y1 - (b // a) * x1
-    y = x1
-    return gcd, x, y
+def check_moduli(big_mod: int, small_mod: int) -> int:
+    # delta = big_mod / small_mod; big_mod must be divisible by small_mod
+    if big_mod % small_mod != 0:
+        raise ValueError(f"big_mod ({big_mod}) must be divisible by small_mod ({small_mod})")
+    return big_mod // small_mod
+
+
+def rounded_division(values: np.ndarray, divisor: int) -> np.ndarray:
+    # round(values / divisor) in exact integer arithmetic: (2x + d) // (2d)
+    return (2 * values + divisor) // (2 * divisor)
+
+
+class ModulusSwitchPlan:
+    # Everything needed to switch from big_mod to small_mod, validated and computed once.
+    # method='advanced' adds t * k with x + t*k ≡ 0 (mod delta) and divides exactly,
+    # which keeps the plaintext; it needs gcd(delta, t) = 1, otherwise 'simple' rounds.
+
+    def __init__(self, big_mod, small_mod, plaintext_modulus, method='advanced'):
+        if method not in ('advanced', 'simple'):
+            raise ValueError(f"Неизвестен метод за modulus switching: {method}")
+        self.big_mod = big_mod
+        self.small_mod = small_mod
+        self.plaintext_modulus = plaintext_modulus
+        self.delta = check_moduli(big_mod, small_mod)
+
+        if method == 'advanced' and math.gcd(self.delta, plaintext_modulus) != 1:
+            method = 'simple'
+        self.method = method
+        self.plaintext_inv = pow(plaintext_modulus, -1, self.delta) if method == 'advanced' else None
 
+    def scale_coefs(self, coefs: np.ndarray) -> np.ndarray:
+        # Coefficients (any shape) switched to small_mod, centered
+        centered = mod_center(np.asarray(coefs, dtype=object), self.big_mod)
+        if self.method == 'advanced':
+            adjustment = mod_center(-centered * self.plaintext_inv, self.delta) * self.plaintext_modulus
+            scaled = (centered + adjustment) // self.delta
+        else:
+            scaled = rounded_division(centered, self.delta)
+        return mod_center(scaled, self.small_mod)
 
-def mod_inverse(a, m):
-    # Find modular inverse of a modulo m
-    gcd, x, y = extended_gcd(a, m)
-    if gcd != 1:
-        raise ValueError(f"Modular inverse does not exist for {a} mod {m} (gcd={gcd})")
-    return (x % m + m) % m
+    def scale(self, x: QuotientRingPoly) -> QuotientRingPoly:
+        return QuotientRingPoly.from_reduced(self.scale_coefs(x.coef), self.small_mod, x.poly_modulus)
+
+    def scale_ciphertext(self, ciphertext):
+        # Switch all components together, as one (k, n) coefficient matrix
+        scaled = self.scale_coefs(np.vstack([component.coef for component in ciphertext]))
+        return tuple(QuotientRingPoly.from_reduced(row, self.small_mod, component.poly_modulus)
+                     for row, component in zip(scaled, ciphertext))
+
+
+@lru_cache(maxsize=64)
+def get_switch_plan(big_mod: int, small_mod: int, plaintext_modulus: int, method: str = 'advanced'):
+    # Shared plan per modulus pair for callers without a KeyMaterialCache
+    return ModulusSwitchPlan(big_mod, small_mod, plaintext_modulus, method)
 
 
 def scale2_func(
     x: QuotientRingPoly, big_mod: int, small_mod: int, plaintext_modulus: int
 ) -> QuotientRingPoly:
-    #Scales a polynomial x from a big coefficient modulus to a smaller one.
-    
-    # Verify that big_mod is divisible by small_mod
-    if big_mod % small_mod != 0:
-        raise ValueError(f"big_mod ({big_mod}) must be divisible by small_mod ({small_mod})")
-    
-    delta = big_mod // small_mod
-    
-    # Create result polynomial
-    result_coef = np.zeros_like(x.coef, dtype=object)
-    
-    # Process each coefficient individually
-    for i, coeff in enumerate(x.coef):
-        # Center the coefficient in [-big_mod/2, big_mod/2)
-        centered_coeff = ((coeff % big_mod) + big_mod // 2) % big_mod - big_mod // 2
-        
-        # Simple scaling: round to nearest multiple of delta, then divide by delta
-        scaled_coeff = round(centered_coeff / delta)
-        
-        # Ensure result is in correct range for small_mod
-        result_coef[i] = scaled_coeff % small_mod
-    
-    # Create new polynomial with small modulus
-    result = QuotientRingPoly(result_coef, small_mod, x.poly_modulus)
-    
-    return result
+    # Scales a polynomial x from a big coefficient modulus to a smaller one by rounding.
+    return get_switch_plan(big_mod, small_mod, plaintext_modulus, 'simple').scale(x)
 
 
 def scale2_advanced(
     x: QuotientRingPoly, big_mod: int, small_mod: int, plaintext_modulus: int
 ) -> QuotientRingPoly:
-    # More sophisticated modulus switching with error correction
-    
-    # Verify that big_mod is divisible by small_mod
-    if big_mod % small_mod != 0:
-        raise ValueError(f"big_mod ({big_mod}) must be divisible by small_mod ({small_mod})")
-    
-    delta = big_mod // small_mod
-    
-    # Check if delta and plaintext_modulus are coprime
-    gcd_val = math.gcd(delta, plaintext_modulus)
-    
-    if gcd_val == 1:
-        # Use the original algorithm when coprime
-        try:
-            # Find modular inverse of plaintext_modulus modulo delta
-            plaintext_inv = mod_inverse(plaintext_modulus, delta)
-            
-            # Calculate adjustment term
-            adjustment_coef = np.zeros_like(x.coef, dtype=object)
-            for i, coeff in enumerate(x.coef):
-                # Center coefficient
-                centered = ((coeff % big_mod) + big_mod // 2) % big_mod - big_mod // 2
-                
-                # Calculate adjustment
-                adj = ((-centered * plaintext_inv) % delta) * plaintext_modulus
-                adjustment_coef[i] = adj
-            
-            # Create adjustment polynomial
-            adjustment = QuotientRingPoly(adjustment_coef, big_mod, x.poly_modulus)
-            
-            # Apply adjustment and scale
-            adjusted = x + adjustment
-            
-            # Scale by small_mod / big_mod
-            result_coef = np.zeros_like(x.coef, dtype=object)
-            for i, coeff in enumerate(adjusted.coef):
-                scaled = (coeff * small_mod) // big_mod
-                result_coef[i] = scaled % small_mod
-                
-            result = QuotientRingPoly(result_coef, small_mod, x.poly_modulus)
-            return result
-            
-        except Exception as e:
-            print(f"Advanced method failed: {e}, falling back to simple method")
-            return scale2_func(x, big_mod, small_mod, plaintext_modulus)
-    else:
-        # Use simple scaling when not coprime
-        return scale2_func(x, big_mod, small_mod, plaintext_modulus)
+    # Modulus switching with plaintext correction (rounding when delta and t are not coprime)
+    return get_switch_plan(big_mod, small_mod, plaintext_modulus).scale(x)
 
 
 def scale2(
     x: QuotientRingPoly, big_mod: int, small_mod: int, plaintext_modulus: int
 ) -> QuotientRingPoly:
-    # Main scaling function - tries advanced method first, falls back to simple if needed.
-    try:
-        return scale2_advanced(x, big_mod, small_mod, plaintext_modulus)
-    except Exception as e:
-        print(f"Advanced scaling failed: {e}")
-        print("Falling back to simple scaling method...")
-        return scale2_func(x, big_mod, small_mod, plaintext_modulus)
+    # Main scaling function: plaintext-preserving switching when possible, rounding otherwise
+    return scale2_advanced(x, big_mod, small_mod, plaintext_modulus)
 
 
 # Functions for compatibility
 def scale(
     x: QuotientRingPoly, big_mod: int, small_mod: int, plaintext_modulus: int
 ) -> QuotientRingPoly:
-    return scale2(x, big_mod, small_mod, plaintext_modulus)
\ No newline at end of file
+    return scale2(x, big_mod, small_mod, plaintext_modulus)
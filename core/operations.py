@@ -2,4 +2,10 @@ def add(c0_left, c1_left, c0_right, c1_right):
     return c0_left + c0_right, c1_left + c1_right
 
 def mul(c0_left, c1_left, c0_right, c1_right):
-    return c0_left * c0_right, c0_left * c1_right + c1_left * c0_right, c1_left * c1_right
\ No newline at end of file
+    return c0_left * c0_right, c0_left * c1_right + c1_left * c0_right, c1_left * c1_right
+
+def add_ciphertexts(left, right):
+    # Component-wise sum of ciphertexts of any degree; missing components count as zero
+    if len(left) < len(right):
+        left, right = right, left
+    return tuple(c + right[i] if i < len(right) else c for i, c in enumerate(left))
@@ -21,6 +21,17 @@ class QuotientRingPoly:
         self.degree = len(poly_modulus) - 1
         self._reduce()
 
+    @classmethod
+    def from_reduced(cls, coef, coef_modulus, poly_modulus) -> "QuotientRingPoly":
+        # Wrap coefficients that are already centered mod coef_modulus and of full
+        # length n, skipping the reduction done by the constructor.
+        poly = cls.__new__(cls)
+        poly._coef_modulus = coef_modulus
+        poly._poly_modulus = init_poly_modulus(poly_modulus)
+        poly._coef = coef
+        poly.degree = len(poly._poly_modulus) - 1
+        return poly
+
     def _reduce(self):
         self._coef = roundv(self._coef)
         self._coef = mod_center(self._coef, self.coef_modulus)
@@ -94,6 +105,19 @@ class QuotientRingPoly:
             and all(self._coef == other.coef)
         )
 
+    def multiplication_matrix(self) -> np.ndarray:
+        # n x n matrix whose row j holds x^j * self reduced mod the (monic) poly modulus,
+        # so a row vector a of coefficients gives the coefficients of a * self as a @ M
+        # (not reduced mod coef_modulus)
+        low_terms = self._poly_modulus[:self.degree]
+        rows = np.empty((self.degree, self.degree), dtype=object)
+        row = self._coef.copy()
+        for j in range(self.degree):
+            rows[j] = row
+            overflow = row[-1]
+            row = np.concatenate(([0], row[:-1])) - overflow * low_terms
+        return rows
+
     def copy(self) -> "QuotientRingPoly":
         return QuotientRingPoly(self.coef, self.coef_modulus, self.poly_modulus)
 
@@ -164,4 +188,17 @@ def random_normal_poly(
     poly_modulus = init_poly_modulus(poly_modulus)
     size = len(poly_modulus) - 1
     coef = np.array([round(random.gauss(mu, std)) for _ in range(size)], dtype=object)
-    return QuotientRingPoly(coef, coef_modulus, poly_modulus)
\ No newline at end of file
+    return QuotientRingPoly(coef, coef_modulus, poly_modulus)
+
+
+def random_uniform_coefs(coef_modulus: int, shape, high=None) -> np.ndarray:
+    # Batch of coefficients with the distribution of random_uniform_poly, e.g. shape (k, n)
+    if high is None:
+        high = coef_modulus - 1
+    count = int(np.prod(shape))
+    return np.array([random.randrange(0, high) for _ in range(count)], dtype=object).reshape(shape)
+
+
+def random_normal_coefs(shape, mu: float = 0, std: float = 3.8) -> np.ndarray:
+    # Batch of rounded normal coefficients with the distribution of random_normal_poly
+    return np.rint(np.random.normal(mu, std, size=shape)).astype(np.int64).astype(object)
@@ -1,62 +1,137 @@
-import math
 from typing import List
 
 import numpy as np
 
-from core.bgv import gen_public_key
-from core.polynomial import QuotientRingPoly
-from core.utils import int2base
+from core.modulus_switch import get_switch_plan
+from core.polynomial import QuotientRingPoly, random_normal_coefs, random_uniform_coefs
+from core.utils import (iter_balanced_digits, iter_base_digits, mod_center,
+                        num_balanced_digits, num_base_digits)
 
 
-def poly2base(poly: QuotientRingPoly, base: int) -> List[QuotientRingPoly]:
+def relinearization_digits(coef_modulus: int, base: int, balanced: bool = False) -> int:
+    # Number of digits (and key pairs) of the decomposition; balanced needs base >= 3
+    if balanced and base > 2:
+        return num_balanced_digits(coef_modulus, base)
+    return num_base_digits(coef_modulus, base)
+
+def decomposition_values(poly: QuotientRingPoly, base: int, balanced: bool = False):
+    # Coefficients as the decomposition expects them: centered for balanced digits, else in [0, q)
+    if balanced and base > 2:
+        return mod_center(poly.coef, poly.coef_modulus)
+    return poly.coef % poly.coef_modulus
+
+def iter_digit_coefs(poly: QuotientRingPoly, base: int, balanced: bool = False):
+    # Yields the coefficient arrays of c^(0), c^(1), ... one at a time (O(n) memory).
+    # balanced=True uses signed digits in [-base/2, base/2) of the centered coefficients (base >= 3).
+    n_terms = relinearization_digits(poly.coef_modulus, base, balanced)
+    return iter_digit_range(decomposition_values(poly, base, balanced), base, balanced, 0, n_terms)
+
+def poly2base(poly: QuotientRingPoly, base: int, balanced: bool = False) -> List[QuotientRingPoly]:
    # Converts a polynomial to a list of polynomials that represent the polynomial's coefficients in the given base.
 
-    coef_modulus = poly.coef_modulus
-    poly_modulus = poly.poly_modulus
-    n_terms = math.ceil(math.log(coef_modulus, base))
-    degree = len(poly.poly_modulus) - 1
-    # Make a matrix to store the coefficients
-    # the rows will represent each coefficient's decomposition in `base`
-    # c^(i) will be formed by taking the columns (each coefficient at step i).
-    coeffs = np.zeros((degree, n_terms), dtype=object)
-
-    for i, coef in enumerate(poly.coef):
-        digits = int2base(coef % coef_modulus, base)
-        # Pad with 0s
-        pad_len = n_terms - len(digits)
-        digits = np.pad(digits, (0, pad_len))
-        coeffs[i] = digits
-
-    # Make list of polynomials
-    res = []
-    for i in range(n_terms):
-        p = QuotientRingPoly(
-            coeffs[:, i], coef_modulus=coef_modulus, poly_modulus=poly_modulus
-        )
-        res.append(p)
-    return res
-
-def gen_relinearization_key(sk, base, coef_modulus, poly_modulus, plaintext_modulus):
-    n_terms = math.ceil(math.log(coef_modulus, base))
-
-    eks = []
-    for i in range(n_terms):
-        b, ai = gen_public_key(sk, coef_modulus, poly_modulus, plaintext_modulus)
-        ek0 = b + (sk * sk) * (base**i)
-        ek1 = ai
-        eks.append((ek0, ek1))
-    return eks
-
-def relinearize(c0, c1, c2, eks, base, coef_modulus, poly_modulus):
-    # Decompose c2
-    c2_polys = poly2base(c2, base)
-    assert len(c2_polys) == len(eks)
-
-    # Construct c0_hat, c1_hat
-    c0_hat = c0
-    c1_hat = c1
-    for c2_i, (ek0, ek1) in zip(c2_polys, eks):
-        c0_hat += c2_i * ek0
-        c1_hat += c2_i * ek1
-
-    return c0_hat, c1_hat
\ No newline at end of file
+    # Digits are far below coef_modulus / 2 and therefore already reduced
+    return [
+        QuotientRingPoly.from_reduced(digit, poly.coef_modulus, poly.poly_modulus)
+        for digit in iter_digit_coefs(poly, base, balanced)
+    ]
+
+def iter_digit_range(values, base: int, balanced: bool, start: int, stop: int):
+    # Digits start..stop-1 of values (reduced mod q, centered if balanced) without
+    # generating the digits below start: jump straight to the running quotient.
+    # Balanced digits satisfy x_(k+1) = (x_k + base // 2) // base.
+    power = base**start
+    if balanced and base > 2:
+        offset = (base // 2) * ((power - 1) // (base - 1))
+        return iter_balanced_digits((values + offset) // power, base, stop - start)
+    return iter_base_digits(values // power, base, stop - start)
+
+def accumulate_key_products(digits, key_coefs):
+    # Σ digit_i * ek0_i and Σ digit_i * ek1_i as unreduced coefficient arrays, accumulated
+    # in place while the digits are generated; the caller reduces once at the end.
+    # key_coefs yields the coefficient arrays (ek0_i, ek1_i).
+    acc0 = acc1 = None
+    for digit, (ek0, ek1) in zip(digits, key_coefs):
+        if acc0 is None:
+            acc0 = np.convolve(digit, ek0)
+            acc1 = np.convolve(digit, ek1)
+        else:
+            acc0 += np.convolve(digit, ek0)
+            acc1 += np.convolve(digit, ek1)
+    return acc0, acc1
+
+def key_coefficients(eks):
+    return ((ek0.coef, ek1.coef) for ek0, ek1 in eks)
+
+def gen_key_switching_keys(sk, target, scales, coef_modulus, poly_modulus, plaintext_modulus):
+    # Key pairs with ek0 + ek1*s = scales[i] * target + t*e_i, all generated as one batch:
+    # a_i and e_i are sampled together and every a_i * s is a row of A @ M(s)
+    degree = sk.degree
+    shape = (len(scales), degree)
+    a = random_uniform_coefs(coef_modulus, shape)
+    e = random_normal_coefs(shape)
+
+    scaled_target = np.outer(np.array(scales, dtype=object), target.coef)
+    b = mod_center(a.dot(sk.multiplication_matrix()) + e * plaintext_modulus + scaled_target,
+                   coef_modulus)
+    minus_a = mod_center(-a, coef_modulus)
+
+    return [(QuotientRingPoly.from_reduced(b[i], coef_modulus, poly_modulus),
+             QuotientRingPoly.from_reduced(minus_a[i], coef_modulus, poly_modulus))
+            for i in range(len(scales))]
+
+def gen_relinearization_key(sk, base, coef_modulus, poly_modulus, plaintext_modulus, balanced=False):
+    # ek0 + ek1*s = base^i * s^2 + t*e_i for every digit i, with s^2 computed once
+    n_terms = relinearization_digits(coef_modulus, base, balanced)
+    scales = [base**i for i in range(n_terms)]
+    return gen_key_switching_keys(sk, sk * sk, scales, coef_modulus, poly_modulus, plaintext_modulus)
+
+def relinearize(c0, c1, c2, eks, base, coef_modulus, poly_modulus, balanced=False):
+    # Stream the digits of c2 (balanced must match the keys) into the key products
+    assert relinearization_digits(coef_modulus, base, balanced) == len(eks)
+    acc0, acc1 = accumulate_key_products(iter_digit_coefs(c2, base, balanced), key_coefficients(eks))
+
+    # Construct c0_hat, c1_hat with a single reduction per component
+    c0_hat = c0 + QuotientRingPoly(acc0, coef_modulus, poly_modulus)
+    c1_hat = c1 + QuotientRingPoly(acc1, coef_modulus, poly_modulus)
+
+    return c0_hat, c1_hat
+
+def hybrid_digit_base(coef_modulus, n_digits):
+    # Power-of-two digit base B with B**n_digits >= coef_modulus
+    return 1 << -(-coef_modulus.bit_length() // n_digits)
+
+def hybrid_special_modulus_bits(coef_modulus, poly_degree, n_digits=1):
+    # Size of P that keeps the key-switching noise (digit * n * e) / P around t
+    digit_bits = hybrid_digit_base(coef_modulus, n_digits).bit_length() - 1
+    return digit_bits + poly_degree.bit_length() + n_digits.bit_length() + 6
+
+def gen_hybrid_relinearization_key(sk, coef_modulus, special_modulus, poly_modulus,
+                                   plaintext_modulus, n_digits=1):
+    # Keys for s^2 over the raised modulus q·P: ek0 + ek1*s = P * B^i * s^2 + t*e
+    raised_modulus = coef_modulus * special_modulus
+    digit_base = hybrid_digit_base(coef_modulus, n_digits)
+
+    raised_sk = sk.copy()
+    raised_sk.coef_modulus = raised_modulus
+
+    scales = [special_modulus * digit_base**i for i in range(n_digits)]
+    return gen_key_switching_keys(raised_sk, raised_sk * raised_sk, scales, raised_modulus,
+                                  poly_modulus, plaintext_modulus)
+
+def relinearize_hybrid(c0, c1, c2, eks, coef_modulus, special_modulus, poly_modulus,
+                       plaintext_modulus, switch_plan=None):
+    # Key switching through q·P: multiply the few large digits of c2 with the
+    # raised keys, then divide by P (P ≡ 1 mod t keeps the plaintext).
+    # switch_plan: precomputed ModulusSwitchPlan from q·P to q
+    raised_modulus = coef_modulus * special_modulus
+    digit_base = hybrid_digit_base(coef_modulus, len(eks))
+    digits = iter_base_digits(c2.coef % coef_modulus, digit_base, len(eks))
+
+    acc0, acc1 = accumulate_key_products(digits, key_coefficients(eks))
+    d0 = QuotientRingPoly(acc0, raised_modulus, poly_modulus)
+    d1 = QuotientRingPoly(acc1, raised_modulus, poly_modulus)
+
+    if switch_plan is None:
+        switch_plan = get_switch_plan(raised_modulus, coef_modulus, plaintext_modulus)
+    d0, d1 = switch_plan.scale_ciphertext((d0, d1))
+    return c0 + d0, c1 + d1
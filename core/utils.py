@@ -17,6 +17,76 @@ def int2base(x: int, base: int):
         x = q
     return digits
 
+def num_base_digits(modulus: int, base: int) -> int:
+    # Number of base-`base` digits needed for values in [0, modulus): smallest k with base**k >= modulus
+    k = 0
+    power = 1
+    while power < modulus:
+        power *= base
+        k += 1
+    return k
+
+def iter_base_digits(values: np.ndarray, base: int, n_terms: int):
+    # Yields digit 0, 1, ... of every non-negative value, one array at a time; only the
+    # running quotient is kept. Power-of-two bases use shifts and masks, others divmod.
+    values = np.asarray(values, dtype=object)
+    if base & (base - 1) == 0:
+        shift = base.bit_length() - 1
+        mask = base - 1
+        for _ in range(n_terms):
+            yield values & mask
+            values = values >> shift
+    else:
+        for _ in range(n_terms):
+            quotient = values // base
+            yield values - quotient * base
+            values = quotient
+
+def num_balanced_digits(modulus: int, base: int) -> int:
+    # Number of balanced digits in [-(base // 2), base - 1 - base // 2] needed for
+    # centered values in [-(modulus // 2), modulus - 1 - modulus // 2]; base >= 3
+    low, high = base // 2, base - 1 - base // 2
+    k = 0
+    span = 0  # (base**k - 1) / (base - 1)
+    while high * span < modulus - 1 - modulus // 2 or low * span < modulus // 2:
+        span = span * base + 1
+        k += 1
+    return k
+
+def iter_balanced_digits(values: np.ndarray, base: int, n_terms: int):
+    # Yields the signed digits of centered values, each in [-(base // 2), base - 1 - base // 2].
+    values = np.asarray(values, dtype=object)
+    half = base // 2
+    if base & (base - 1) == 0:
+        shift = base.bit_length() - 1
+        mask = base - 1
+        for _ in range(n_terms):
+            digit = ((values + half) & mask) - half
+            yield digit
+            values = (values - digit) >> shift
+    else:
+        for _ in range(n_terms):
+            digit = (values + half) % base - half
+            yield digit
+            values = (values - digit) // base
+
+def infinity_norm(coefs) -> int:
+    # max |c| of an integer (object) array without building the array of absolute values
+    coefs = np.asarray(coefs, dtype=object)
+    if coefs.size == 0:
+        return 0
+    return max(int(coefs.max()), -int(coefs.min()))
+
+def is_negacyclic(poly_modulus) -> bool:
+    # True for x^n + 1
+    poly_modulus = np.asarray(poly_modulus, dtype=object)
+    return (len(poly_modulus) > 1 and poly_modulus[0] == 1 and poly_modulus[-1] == 1
+            and not poly_modulus[1:-1].any())
+
+def negacyclic_row(coefs: np.ndarray, index: int) -> np.ndarray:
+    # Row `index` of the multiplication by coefs mod x^n + 1: (a * coefs)[index] = a · row
+    return np.concatenate((coefs[index::-1], -coefs[:index:-1]))
+
 def roundv(array):
     return np.array([round(a) for a in array], dtype=object)
 
@@ -0,0 +1,271 @@
+import time
+
+from core.polynomial import random_uniform_poly
+from core.relinearization import relinearization_digits
+from crypto.noise_metrics import noise_bits
+
+# Cost of the simulated steps in ring products (one polymul + reduction at the top modulus)
+MULTIPLY_COST = 4        # c0*c0', c0*c1' + c1*c0', c1*c1'
+KEY_PRODUCT_COST = 0.5   # Two convolutions of one small digit with the keys
+SWITCH_COST = 0.05       # Exact division of every coefficient, O(n)
+ADD_COST = 0.02          # Per component, O(n)
+
+# Why a planned step fails
+BLOCKED_BEFORE = 'blocked_before'    # check_operation_feasibility refuses the operands
+BLOCKED_AFTER = 'blocked_after'      # perform_operation computes the result and discards it
+
+
+def normalize_steps(steps):
+    # (left, op, right[, result]) tuples or operation_history entries as history-style dicts;
+    # failed history entries (no op_type) are skipped, missing result names become R1, R2, ...
+    normalized = []
+    for step in steps:
+        if isinstance(step, dict):
+            if not step.get('op_type'):
+                continue
+            left, operation, right = step['left_op'], step['op_type'], step['right_op']
+            result = step.get('result')
+        else:
+            left, operation, right = step[:3]
+            result = step[3] if len(step) > 3 else None
+        if operation not in ('+', '*'):
+            raise ValueError(f"Неподдържана операция: {operation}")
+        normalized.append({
+            'left_op': left,
+            'op_type': operation,
+            'right_op': right,
+            'result': result or f"R{len(normalized) + 1}"
+        })
+    return normalized
+
+
+class CircuitPlanner:
+    # Simulates a sequence of operations on noise bounds only, the way OperationsTab runs
+    # them through OperationHandler: feasibility check, scheduled or automatic switching,
+    # relinearization and level alignment, the operation, the result check and the automatic
+    # switching of the result. Reports noise, level, depth, switching points and estimated
+    # runtime per step and the first step that would fail, without touching a ciphertext.
+
+    def __init__(self, handler, seconds_per_product=None):
+        self.handler = handler
+        self.moduli = handler.moduli
+        # The tracked bounds of the handler, or the heuristic rules when it measures noise
+        self.estimator = handler.noise_model
+        self._seconds_per_product = seconds_per_product
+
+    def seconds_per_product(self):
+        # Time of one ring product at the top modulus, measured once (best of 3)
+        if self._seconds_per_product is None:
+            left = random_uniform_poly(self.moduli[0], self.handler.poly_modulus)
+            right = random_uniform_poly(self.moduli[0], self.handler.poly_modulus)
+            timings = []
+            for _ in range(3):
+                start = time.perf_counter()
+                left * right
+                timings.append(time.perf_counter() - start)
+            self._seconds_per_product = min(timings)
+        return self._seconds_per_product
+
+    def level_scale(self, level):
+        # Big-integer products get cheaper with the modulus, roughly linearly in its bits
+        return self.moduli[level].bit_length() / self.moduli[0].bit_length()
+
+    def relinearization_cost(self, level):
+        modulus = self.moduli[level]
+        if self.handler.key_switching == 'hybrid':
+            raised = modulus.bit_length() + self.handler.special_modulus.bit_length()
+            return (self.handler.hybrid_digits * KEY_PRODUCT_COST * raised / self.moduli[0].bit_length()
+                    + SWITCH_COST)
+        digits = relinearization_digits(modulus, self.handler.base, self.handler.balanced_digits)
+        return digits * KEY_PRODUCT_COST * self.level_scale(level)
+
+    def initial_state(self, ciphertext):
+        # Simulation state of a stored ciphertext: its tracked bound, else the handler's check
+        return {
+            'noise': self.handler.model_noise(ciphertext),
+            'level': self.handler.get_level(ciphertext[0]),
+            'components': len(ciphertext),
+            'depth': 0
+        }
+
+    def fresh_state(self, level=0):
+        return {'noise': self.estimator.fresh(), 'level': level, 'components': 2, 'depth': 0}
+
+    def max_bits(self, level):
+        return (self.moduli[level] // 2).bit_length()
+
+    def _relinearize(self, state, events, name):
+        if state['components'] == 2:
+            return 0
+        state['noise'] = self.estimator.relinearize(state['noise'], self.moduli[state['level']])
+        state['components'] = 2
+        events.append(('relinearize', name, state['level']))
+        return self.relinearization_cost(state['level'])
+
+    def _switch(self, state, events, name):
+        # apply_modulus_switching: not below the switching threshold, above the critical
+        # ratio or at the bottom of the chain
+        level = state['level']
+        if level + 1 >= len(self.moduli):
+            return False
+        bits = noise_bits(state['noise'])
+        max_bits = self.max_bits(level)
+        if bits <= max(1, int(max_bits * self.handler.switching_ratio)):
+            return False
+        if bits > int(max_bits * self.handler.critical_ratio):
+            return False
+        delta = self.moduli[level] // self.moduli[level + 1]
+        state['noise'] = self.estimator.switch(state['noise'], delta)
+        state['level'] = level + 1
+        events.append(('switch', name, level + 1))
+        return True
+
+    def _align(self, left, right, events, left_name, right_name):
+        # align_levels: the higher operand goes straight to the lower level, unconditionally
+        if left['level'] == right['level']:
+            return 0
+        name, state, target = ((left_name, left, right['level']) if left['level'] < right['level']
+                               else (right_name, right, left['level']))
+        cost = self._relinearize(state, events, name)
+        delta = self.moduli[state['level']] // self.moduli[target]
+        state['noise'] = self.estimator.switch(state['noise'], delta)
+        state['level'] = target
+        events.append(('align', name, target))
+        return cost + 2 * SWITCH_COST
+    
+    def _auto_switch(self, state, events, name):
+        # check_and_apply_auto_switching; returns the cost
+        max_bits = self.max_bits(state['level'])
+        switching_threshold, _, _ = self.handler.calculate_dynamic_thresholds(max_bits)
+        if noise_bits(state['noise']) <= switching_threshold:
+            return 0
+        cost = self._relinearize(state, events, name)
+        if self._switch(state, events, name):
+            cost += 2 * SWITCH_COST
+        return cost
+
+    def _scheduled_switch(self, left_name, right_name, states, events):
+        # apply_scheduled_switching of a product: both operands to the scheduler's level
+        names = list(dict.fromkeys((left_name, right_name)))
+        cost = sum(self._relinearize(states[name], events, name) for name in names)
+        left, right = states[left_name], states[right_name]
+        target = self.handler.switching_scheduler.multiplication_level(
+            left['noise'], left['level'], right['noise'], right['level']
+        )
+        while min(states[name]['level'] for name in names) < target:
+            top = min(states[name]['level'] for name in names)
+            batch = [name for name in names if states[name]['level'] == top]
+            delta = self.moduli[top] // self.moduli[top + 1]
+            for name in batch:
+                states[name]['noise'] = self.estimator.switch(states[name]['noise'], delta)
+                states[name]['level'] = top + 1
+            events.append(('switch', ', '.join(batch), top + 1))
+            cost += SWITCH_COST * 2 * len(batch)
+        return cost
+
+    def plan(self, steps, encrypted_values=None, input_level=0):
+        # Simulate steps (see normalize_steps). Operands found in encrypted_values start from
+        # their stored state, any other name that no earlier step produced is a fresh
+        # encryption at input_level. Depth counts the multiplications of the plan.
+        # Stops at the first failing step.
+        stored = encrypted_values or {}
+        states = {}
+
+        seconds = self.seconds_per_product()
+        report = []
+        first_failure = None
+        total_cost = 0
+
+        for index, step in enumerate(normalize_steps(steps), 1):
+            left_name, operation, right_name = step['left_op'], step['op_type'], step['right_op']
+            events = []
+            cost = 0
+            failure = None
+
+            for name in (left_name, right_name):
+                if name not in states:
+                    states[name] = (self.initial_state(stored[name]) if name in stored
+                                    else self.fresh_state(input_level))
+            left, right = states[left_name], states[right_name]
+            result = None
+
+            # check_operation_feasibility
+            worst = max((left, right), key=lambda state: noise_bits(state['noise']))
+            _, _, critical_threshold = self.handler.calculate_dynamic_thresholds(self.max_bits(worst['level']))
+            if noise_bits(worst['noise']) > critical_threshold:
+                failure = BLOCKED_BEFORE
+                result = worst
+
+            if failure is None:
+                if self.handler.switching_scheduler is not None and operation == '*':
+                    cost += self._scheduled_switch(left_name, right_name, states, events)
+                else:
+                    for name in dict.fromkeys((left_name, right_name)):
+                        cost += self._auto_switch(states[name], events, name)
+
+                # perform_operation: relinearized operands for products, then level alignment
+                if operation == '*':
+                    cost += self._relinearize(left, events, left_name)
+                    cost += self._relinearize(right, events, right_name)
+                cost += self._align(left, right, events, left_name, right_name)
+
+                level = left['level']
+                scale = self.level_scale(level)
+                if operation == '+':
+                    result = {'noise': self.estimator.add(left['noise'], right['noise']),
+                              'level': level,
+                              'components': max(left['components'], right['components']),
+                              'depth': max(left['depth'], right['depth'])}
+                    cost += ADD_COST * result['components'] * scale
+                else:
+                    result = {'noise': self.estimator.multiply(left['noise'], right['noise']),
+                              'level': level,
+                              'components': 3,
+                              'depth': max(left['depth'], right['depth']) + 1}
+                    cost += MULTIPLY_COST * scale
+                    if not self.handler.lazy_relinearization:
+                        cost += self._relinearize(result, events, step['result'])
+
+                _, _, critical_threshold = self.handler.calculate_dynamic_thresholds(self.max_bits(level))
+                if noise_bits(result['noise']) > critical_threshold:
+                    failure = BLOCKED_AFTER
+                else:
+                    states[step['result']] = result
+                    if self.handler.switching_scheduler is None:
+                        cost += self._auto_switch(result, events, step['result'])
+
+            # Noise of the result or of the operand that blocks the step
+            entry = {
+                'step': index,
+                'operation': f"{left_name} {operation} {right_name}",
+                'result': step['result'],
+                'success': failure is None,
+                'failure': failure,
+                'events': events,
+                'cost': cost,
+                'seconds': cost * seconds
+            }
+            if result is not None:
+                max_bits = self.max_bits(result['level'])
+                entry.update({
+                    'level': result['level'],
+                    'components': result['components'],
+                    'depth': result['depth'],
+                    'noise_bits': noise_bits(result['noise']),
+                    'max_bits': max_bits,
+                    'budget_bits': max_bits - noise_bits(result['noise'])
+                })
+            report.append(entry)
+            total_cost += cost
+
+            if failure is not None:
+                first_failure = entry
+                break
+
+        return {
+            'feasible': first_failure is None,
+            'first_failure': first_failure,
+            'steps': report,
+            'total_cost': total_cost,
+            'total_seconds': total_cost * seconds
+        }
@@ -0,0 +1,89 @@
+from core.relinearization import relinearization_digits
+from crypto.noise_estimate import NoiseEstimator
+from crypto.noise_management import dynamic_thresholds
+from crypto.noise_metrics import noise_bits
+from crypto.switching_scheduler import SwitchingScheduler
+
+# Relative cost of extracting one digit per coefficient: shift/mask vs. divmod
+SHIFT_DIGIT_COST = 1
+DIVMOD_DIGIT_COST = 4
+
+
+def candidate_bases(max_base=1 << 16):
+    # Small bases 2..10 plus every power of two up to max_base
+    bases = set(range(2, min(10, max_base) + 1))
+    power = 16
+    while power <= max_base:
+        bases.add(power)
+        power <<= 1
+    return sorted(bases)
+
+
+def estimate_base_cost(n, coef_modulus, plaintext_modulus, base, depth=1, balanced=False,
+                       heuristic=True, moduli=None, thresholds=dynamic_thresholds, critical_ratio=0.85,
+                       min_gain_bits=10, margin_bits=10):
+    # Estimated relinearization time, key memory and noise after `depth` squarings of a
+    # fresh ciphertext when relinearizing in the given base. The squarings walk down the
+    # chain `moduli` (default: coef_modulus alone) by the SwitchingScheduler rule and each
+    # product must stay under the critical threshold of its level, as the handler enforces.
+    digits = relinearization_digits(coef_modulus, base, balanced)
+    modulus_bits = coef_modulus.bit_length()
+
+    # Two ring products (n^2 coefficient products each) per digit, plus the decomposition
+    digit_cost = SHIFT_DIGIT_COST if base & (base - 1) == 0 else DIVMOD_DIGIT_COST
+    time_units = digits * (2 * n * n + digit_cost * n)
+
+    # digits key pairs of two polynomials with n coefficients of modulus_bits each
+    key_bytes = digits * 2 * n * ((modulus_bits + 7) // 8)
+
+    estimator = NoiseEstimator(n, plaintext_modulus, base, balanced, heuristic=heuristic)
+    scheduler = SwitchingScheduler(moduli or [coef_modulus], estimator,
+                                   lambda max_bits: thresholds(max_bits)[0],
+                                   critical_ratio, min_gain_bits, margin_bits)
+    relin_bits = noise_bits(estimator.relinearize(0, coef_modulus))
+
+    # Relinearized squarings of a fresh ciphertext, switched before each product
+    noise, level = estimator.fresh(), 0
+    budget_bits = thresholds(scheduler.max_bits(0))[2] - noise_bits(noise)
+    squarings = 0
+    while squarings < depth:
+        target = scheduler.multiplication_level(noise, level, noise, level)
+        noise = scheduler.switched_noise(noise, level, target) or noise
+        level = target
+        noise = scheduler.product_noise(noise, noise, level)
+        budget_bits = thresholds(scheduler.max_bits(level))[2] - noise_bits(noise)
+        if budget_bits < 0:
+            break
+        squarings += 1
+
+    return {
+        'base': base,
+        'digits': digits,
+        'products': 2 * digits,
+        'time_units': time_units,
+        'key_bytes': key_bytes,
+        'relin_noise_bits': relin_bits,
+        'noise_bits': noise_bits(noise),
+        'level': level,
+        'squarings': squarings,
+        'budget_bits': budget_bits,
+        'feasible': squarings == depth,
+    }
+
+
+def recommend_base(n, coef_modulus, plaintext_modulus, depth=1, candidates=None, balanced=False,
+                   heuristic=True, **chain):
+    # Fastest base that completes `depth` squarings along the chain (keyword arguments of
+    # estimate_base_cost); ties go to the smaller key, then to the lower noise. If no base
+    # completes them, noise is dominated by the squarings rather than the base, so the
+    # fastest base is kept.
+    if candidates is None:
+        candidates = candidate_bases()
+
+    estimates = [estimate_base_cost(n, coef_modulus, plaintext_modulus, base, depth, balanced, heuristic,
+                                    **chain)
+                 for base in candidates]
+    feasible = [e for e in estimates if e['feasible']] or estimates
+    best = min(feasible, key=lambda e: (e['time_units'], e['key_bytes'], e['noise_bits']))
+
+    return dict(best, candidates=estimates)
@@ -0,0 +1,149 @@
+import threading
+
+from core.modulus_switch import ModulusSwitchPlan
+from core.relinearization import gen_hybrid_relinearization_key, gen_relinearization_key
+
+
+class KeyMaterialCache:
+    # Secret key reduced to every level of the modulus chain, its powers, the public key and
+    # the relinearization keys of that level. Entries are built on first use or by warm_up().
+    # key_switching='hybrid' builds keys over q·special_modulus with hybrid_digits digits,
+    # balanced=True builds keys for the signed-digit decomposition.
+    # Modulus switching plans do not depend on sk and survive invalidate().
+
+    def __init__(self, sk, moduli, poly_modulus, plaintext_modulus, base,
+                 key_switching='base', special_modulus=None, hybrid_digits=1, balanced=False,
+                 public_key=None):
+        self.sk = sk
+        # (pk0, pk1) at the top modulus; pk mod q_l is a public key for sk mod q_l
+        self.public_key = public_key
+        self.moduli = list(moduli)
+        self.poly_modulus = poly_modulus
+        self.plaintext_modulus = plaintext_modulus
+        self.base = base
+        self.key_switching = key_switching
+        self.special_modulus = special_modulus
+        self.hybrid_digits = hybrid_digits
+        self.balanced = balanced
+
+        self._entries = {}
+        # (big_mod, small_mod) -> ModulusSwitchPlan
+        self._switch_plans = {}
+        self._lock = threading.Lock()
+        self._level_locks = {modulus: threading.Lock() for modulus in self.moduli}
+        # Bumped by invalidate() so a running warm-up drops keys of the old sk
+        self._generation = 0
+        self._warm_up_thread = None
+
+    def _entry(self, modulus):
+        with self._lock:
+            entry = self._entries.get(modulus)
+            if entry is None:
+                if modulus == self.sk.coef_modulus:
+                    level_sk = self.sk
+                else:
+                    level_sk = self.sk.copy()
+                    level_sk.coef_modulus = modulus
+                entry = {'sk': level_sk, 'sk_powers': [level_sk], 'pk': None, 'eks': None}
+                self._entries[modulus] = entry
+            return entry
+
+    def get_sk(self, modulus):
+        # Secret key reduced mod the given modulus
+        return self._entry(modulus)['sk']
+
+    def get_sk_power(self, modulus, power):
+        # sk^power mod the given modulus, power >= 1
+        entry = self._entry(modulus)
+        with self._lock:
+            powers = entry['sk_powers']
+            while len(powers) < power:
+                powers.append(powers[-1] * entry['sk'])
+            return powers[power - 1]
+
+    def get_public_key(self, modulus):
+        # Public key (pk0, pk1) reduced mod the given modulus
+        if self.public_key is None:
+            raise ValueError("Няма публичен ключ.")
+        entry = self._entry(modulus)
+        with self._lock:
+            if entry['pk'] is None:
+                level_pk = []
+                for component in self.public_key:
+                    if component.coef_modulus != modulus:
+                        component = component.copy()
+                        component.coef_modulus = modulus
+                    level_pk.append(component)
+                entry['pk'] = tuple(level_pk)
+            return entry['pk']
+
+    def get_relinearization_keys(self, modulus):
+        # Relinearization keys of the given level, generated once per sk
+        entry = self._entry(modulus)
+        if entry['eks'] is not None:
+            return entry['eks']
+
+        with self._level_locks.setdefault(modulus, threading.Lock()):
+            # Another thread (e.g. warm-up) may have finished the keys meanwhile;
+            # an entry dropped by invalidate() is simply not reused
+            if entry['eks'] is None and self.key_switching == 'hybrid':
+                entry['eks'] = gen_hybrid_relinearization_key(
+                    entry['sk'], modulus, self.special_modulus,
+                    self.poly_modulus, self.plaintext_modulus, self.hybrid_digits
+                )
+            elif entry['eks'] is None:
+                entry['eks'] = gen_relinearization_key(
+                    entry['sk'], self.base, modulus,
+                    self.poly_modulus, self.plaintext_modulus, self.balanced
+                )
+        return entry['eks']
+
+    def get_switch_plan(self, big_mod, small_mod=None):
+        # Plan for switching from big_mod to small_mod (default: the next level down)
+        if small_mod is None:
+            level = self.moduli.index(big_mod)
+            if level + 1 >= len(self.moduli):
+                return None
+            small_mod = self.moduli[level + 1]
+        with self._lock:
+            plan = self._switch_plans.get((big_mod, small_mod))
+            if plan is None:
+                plan = ModulusSwitchPlan(big_mod, small_mod, self.plaintext_modulus)
+                self._switch_plans[(big_mod, small_mod)] = plan
+            return plan
+
+    def get_key_switching_plan(self, modulus):
+        # Plan for the descent from q·special_modulus back to q after hybrid key switching
+        return self.get_switch_plan(modulus * self.special_modulus, modulus)
+
+    def warm_up(self, background=True):
+        # Precompute the key material of every level, top level first
+        def build(generation):
+            for modulus in self.moduli:
+                if generation != self._generation:
+                    return
+                self.get_sk_power(modulus, 2)
+                self.get_relinearization_keys(modulus)
+                self.get_switch_plan(modulus)
+                if self.key_switching == 'hybrid':
+                    self.get_key_switching_plan(modulus)
+
+        if not background:
+            build(self._generation)
+            return None
+
+        self._warm_up_thread = threading.Thread(
+            target=build, args=(self._generation,), name="key-material-warm-up", daemon=True
+        )
+        self._warm_up_thread.start()
+        return self._warm_up_thread
+
+    def invalidate(self, sk=None, public_key=None):
+        # Drop all cached material, e.g. after the keys were regenerated
+        with self._lock:
+            self._generation += 1
+            self._entries = {}
+            if sk is not None:
+                self.sk = sk
+            if public_key is not None:
+                self.public_key = public_key
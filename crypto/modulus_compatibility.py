@@ -1,8 +1,59 @@
 import math
+import multiprocessing
+import os
 import random
+import threading
+from concurrent.futures import (FIRST_COMPLETED, BrokenExecutor, CancelledError,
+                                Future, ProcessPoolExecutor, wait)
 
+import numpy as np
 from Crypto.Util.number import getRandomNBitInteger
 
+# Sieve settings for the delta search
+SIEVE_PRIME_LIMIT = 1 << 16   # Trial-divide candidates by all primes below this bound
+SIEVE_WINDOW = 4096           # Candidates examined per sieve window
+MAX_SIEVE_WINDOWS = 64        # Windows to scan before giving up on a prime delta
+
+# Chain primes: expected primes of the chosen size per prime needed, and extra bits tried
+# one at a time when the progression still runs out of primes of that size
+CHAIN_PRIME_DENSITY = 2
+CHAIN_EXTRA_BITS = 3
+
+
+def small_primes_below(limit):
+    # Primes below limit (sieve of Eratosthenes)
+    is_prime = np.ones(limit, dtype=bool)
+    is_prime[:2] = False
+    is_prime[4::2] = False
+    for p in range(3, math.isqrt(limit - 1) + 1, 2):
+        if is_prime[p]:
+            is_prime[p * p::2 * p] = False
+    return np.flatnonzero(is_prime)
+
+
+SMALL_PRIMES = small_primes_below(SIEVE_PRIME_LIMIT)
+
+
+def euler_phi(m):
+    # Euler's totient by trial division (m is small: lcm(2n, t))
+    result = m
+    p = 2
+    while p * p <= m:
+        if m % p == 0:
+            while m % p == 0:
+                m //= p
+            result -= result // p
+        p += 1
+    if m > 1:
+        result -= result // m
+    return result
+
+
+def expected_primes_in_progression(bits, step):
+    # Expected number of bits-bit primes ≡ 1 (mod step): the primes of that size spread
+    # evenly over the φ(step) residues coprime to step
+    return 2 ** (bits - 1) / ((bits - 1) * math.log(2)) / euler_phi(step)
+
 
 def is_probably_prime(n, k=10):
     # Miller-Rabin primality test
@@ -35,7 +86,233 @@ def is_probably_prime(n, k=10):
     return True
 
 
-def generate_compatible_modulus(lambda_bits, plaintext_modulus):
+def is_strong_probable_prime_base2(n):
+    # Single Miller-Rabin round with the fixed base 2
+    if n < 5:
+        return n in (2, 3)
+    if n % 2 == 0:
+        return False
+
+    r = 0
+    d = n - 1
+    while d % 2 == 0:
+        d //= 2
+        r += 1
+
+    x = pow(2, d, n)
+    if x == 1 or x == n - 1:
+        return True
+    for _ in range(r - 1):
+        x = pow(x, 2, n)
+        if x == n - 1:
+            return True
+    return False
+
+
+def residues_mod_small_primes(x, primes=SMALL_PRIMES):
+    # x mod p for every p in primes, via Horner's rule over 15-bit limbs of x
+    x = abs(x)
+    residues = np.zeros(len(primes), dtype=np.int64)
+    for shift in range((x.bit_length() // 15) * 15, -1, -15):
+        limb = (x >> shift) & 0x7FFF
+        residues = (residues * 0x8000 + limb) % primes
+    return residues
+
+
+def inverse_mod_small_primes(a, primes=SMALL_PRIMES):
+    # a^(p-2) mod p for each p (Fermat inverse); entries with a ≡ 0 stay 0
+    result = np.ones(len(primes), dtype=np.int64)
+    base = a % primes
+    exponent = primes - 2
+    while np.any(exponent):
+        odd = (exponent & 1).astype(bool)
+        result[odd] = (result[odd] * base[odd]) % primes[odd]
+        base = (base * base) % primes
+        exponent >>= 1
+    return np.where(a % primes == 0, 0, result)
+
+
+def sieve_progression(start, step, window, primes=SMALL_PRIMES):
+    # Offsets k in [0, window) for which start + k*step has no factor in primes
+    # (candidates are assumed to be larger than the primes themselves).
+    # For every prime p not dividing step, the multiples of p in the progression
+    # are exactly k ≡ -start * step^(-1) (mod p).
+    start_mod = residues_mod_small_primes(start, primes)
+    step_mod = residues_mod_small_primes(step, primes)
+
+    survivors = np.ones(window, dtype=bool)
+
+    # p | step: p divides either every candidate or none of them
+    divides_step = step_mod == 0
+    if np.any(divides_step & (start_mod == 0)):
+        return np.array([], dtype=np.int64)
+
+    p = primes[~divides_step]
+    first = (-start_mod[~divides_step] * inverse_mod_small_primes(step_mod[~divides_step], p)) % p
+
+    # Expand every arithmetic progression first + j*p (< window) into flat indices
+    counts = np.maximum(0, (window - first + p - 1) // p)
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    survivors[np.repeat(first, counts) + np.repeat(p, counts) * offsets] = False
+
+    return np.flatnonzero(survivors)
+
+
+class SearchCancelled(CancelledError):
+    # A stopped search window; attempts = candidates it tried before the stop
+
+    def __init__(self, attempts=0):
+        super().__init__(attempts)
+        self.attempts = attempts
+
+
+def find_prime_in_progression(start, step, window=SIEVE_WINDOW,
+                              max_windows=MAX_SIEVE_WINDOWS, rounds=10,
+                              first_window=0, cancel_event=None):
+    # Smallest probable prime of the form start + k*step, scanning the windows
+    # [first_window, first_window + max_windows) of `window` candidates each.
+    # Returns (prime or None, number of candidates tried); raises SearchCancelled
+    # when cancel_event is set.
+    attempts = 0
+    for w in range(first_window, first_window + max_windows):
+        window_start = start + w * window * step
+        for k in sieve_progression(window_start, step, window).tolist():
+            if cancel_event is not None and cancel_event.is_set():
+                raise SearchCancelled(attempts)
+            candidate = window_start + k * step
+            attempts += 1
+            if is_strong_probable_prime_base2(candidate) and is_probably_prime(candidate, rounds):
+                return candidate, attempts
+    return None, attempts
+
+
+# One process pool for all parallel searches, started on first use. Starting a pool
+# costs more than a whole sequential search at the GUI's λ, so it is never rebuilt
+# per search. Searches take turns; each one gets a new generation number and its
+# tasks stop as soon as the shared counter has moved past it.
+_search_pool = None
+_search_pool_workers = 0
+_search_generation = None
+_search_pool_lock = threading.Lock()
+
+_worker_generation = None
+
+
+class _GenerationStop:
+    # Stop flag of the tasks of one search inside a worker process
+
+    def __init__(self, generation):
+        self.generation = generation
+
+    def is_set(self):
+        return _worker_generation.value != self.generation
+
+
+def _init_search_worker(generation):
+    # Worker initializer: keep the shared generation counter of the pool
+    global _worker_generation
+    _worker_generation = generation
+
+
+def _scan_prime_window(start, step, window_index, window, rounds, generation):
+    # Worker task: scan a single sieve window
+    return find_prime_in_progression(start, step, window, 1, rounds, first_window=window_index,
+                                     cancel_event=_GenerationStop(generation))
+
+
+def _get_search_pool(max_workers):
+    # The shared pool, rebuilt only when the number of workers changes
+    global _search_pool, _search_pool_workers, _search_generation
+    if _search_pool is None or _search_pool_workers != max_workers:
+        shutdown_search_pool()
+        # Spawned workers: forking the Tk process would copy its threads' locks mid-use
+        context = multiprocessing.get_context("spawn")
+        _search_generation = context.RawValue('q', 0)
+        _search_pool = ProcessPoolExecutor(max_workers=max_workers, mp_context=context,
+                                           initializer=_init_search_worker,
+                                           initargs=(_search_generation,))
+        _search_pool_workers = max_workers
+    return _search_pool
+
+
+def shutdown_search_pool():
+    # Stop the worker processes of the shared pool (e.g. when the application closes)
+    global _search_pool
+    if _search_pool is not None:
+        _search_generation.value += 1
+        _search_pool.shutdown(wait=False, cancel_futures=True)
+        _search_pool = None
+
+
+def _collect_attempts(tasks):
+    # Candidates tried by tasks that were stopped or finished after the winner;
+    # tasks that never started are cancelled and count nothing
+    attempts = 0
+    for task in tasks:
+        if task.cancel():
+            continue
+        try:
+            attempts += task.result()[1]
+        except SearchCancelled as e:
+            attempts += e.attempts
+        except CancelledError:
+            pass
+    return attempts
+
+
+def find_prime_in_progression_parallel(start, step, max_workers=None, window=SIEVE_WINDOW,
+                                       max_windows=MAX_SIEVE_WINDOWS, rounds=10,
+                                       cancel_event=None):
+    # Same search as find_prime_in_progression, with the windows handed out to the
+    # shared process pool. Each task owns a disjoint window; the first prime found wins
+    # and the other tasks stop at their next candidate. attempts counts the candidates
+    # of every window, including the stopped ones.
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    if max_workers <= 1:
+        return find_prime_in_progression(start, step, window, max_windows, rounds,
+                                         cancel_event=cancel_event)
+
+    with _search_pool_lock:
+        pool = _get_search_pool(max_workers)
+        generation = _search_generation.value
+        attempts = 0
+        next_window = 0
+        pending = set()
+        prime = None
+        try:
+            while next_window < min(max_workers, max_windows):
+                pending.add(pool.submit(_scan_prime_window, start, step, next_window, window,
+                                        rounds, generation))
+                next_window += 1
+
+            while pending and prime is None:
+                if cancel_event is not None and cancel_event.is_set():
+                    raise CancelledError()
+
+                done, pending = wait(pending, timeout=0.1, return_when=FIRST_COMPLETED)
+                for task in done:
+                    found, tried = task.result()
+                    attempts += tried
+                    if found is not None:
+                        prime = found if prime is None else min(prime, found)
+
+                    if prime is None and next_window < max_windows:
+                        pending.add(pool.submit(_scan_prime_window, start, step, next_window, window,
+                                                rounds, generation))
+                        next_window += 1
+        except BrokenExecutor:
+            shutdown_search_pool()
+            raise
+        finally:
+            # Stop the losers of this search
+            _search_generation.value += 1
+
+        return prime, attempts + _collect_attempts(pending)
+
+
+def generate_compatible_modulus(lambda_bits, plaintext_modulus, return_attempts=False,
+                                max_workers=1, cancel_event=None):
     # Generate properly compatible moduls for modulus switching.
     
     print(f"Generating compatible modulus for λ={lambda_bits}, t={plaintext_modulus}")
@@ -80,15 +357,17 @@ def generate_compatible_modulus(lambda_bits, plaintext_modulus):
         remainder = min_delta % plaintext_modulus
         delta = min_delta + (plaintext_modulus - remainder + 1)
     
-    # Try to make delta prime for better security (optional)
-    delta_attempts = 0
-    while delta_attempts < 50:
-        if is_probably_prime(delta):
-            break
-        delta += plaintext_modulus  # Maintain the ≡ 1 (mod t) property
-        delta_attempts += 1
+    # Make delta prime: sieve the progression delta + k*t (keeps the ≡ 1 (mod t) property)
+    prime_delta, delta_attempts = find_prime_in_progression_parallel(
+        delta, plaintext_modulus, max_workers=max_workers, cancel_event=cancel_event
+    )
+    if prime_delta is not None:
+        delta = prime_delta
+    else:
+        print(f"⚠️  No prime delta found after {delta_attempts} candidates, using composite delta")
     
     print(f"✅ Found delta: {delta} ({delta.bit_length()} bits)")
+    print(f"   Candidates tested: {delta_attempts}")
     print(f"   delta ≡ {delta % plaintext_modulus} (mod {plaintext_modulus}) - should be 1")
     
     # Step 3: Calculate large modulus
@@ -110,10 +389,194 @@ def generate_compatible_modulus(lambda_bits, plaintext_modulus):
     
     print(f"✅ All constraints satisfied!\n")
     
+    if return_attempts:
+        return large_modulus, small_modulus, delta, delta_attempts
     return large_modulus, small_modulus, delta
 
 
-def verify_modulus_compatibility(large_modulus, small_modulus, plaintext_modulus):
+def _submit_search(search_func, *args, **kwargs):
+    # Run search_func(*args, cancel_event=..., **kwargs) in the background and return
+    # a Future. Cancelling the future stops the worker processes; use
+    # future.result(timeout) to bound the wait.
+    future = Future()
+    cancel_event = threading.Event()
+    future.add_done_callback(lambda f: f.cancelled() and cancel_event.set())
+
+    def run():
+        try:
+            result = search_func(*args, cancel_event=cancel_event, **kwargs)
+        except CancelledError:
+            return
+        except Exception as e:
+            if future.set_running_or_notify_cancel():
+                future.set_exception(e)
+            return
+
+        if future.set_running_or_notify_cancel():
+            future.set_result(result)
+
+    threading.Thread(target=run, daemon=True).start()
+    return future
+
+
+def generate_compatible_modulus_async(lambda_bits, plaintext_modulus, max_workers=None):
+    # Future for (large_modulus, small_modulus, delta, attempts)
+    return _submit_search(generate_compatible_modulus, lambda_bits, plaintext_modulus,
+                          return_attempts=True, max_workers=max_workers)
+
+
+def find_negacyclic_root(prime, poly_degree):
+    # Primitive 2n-th root of unity psi mod prime (psi^n ≡ -1), requires prime ≡ 1 (mod 2n)
+    exponent = (prime - 1) // (2 * poly_degree)
+    for g in range(2, prime):
+        psi = pow(g, exponent, prime)
+        if pow(psi, poly_degree, prime) == prime - 1:
+            return psi
+    raise ValueError(f"No primitive {2 * poly_degree}-th root of unity modulo {prime}")
+
+
+def generate_prime_chain(poly_degree, plaintext_modulus, levels, prime_bits, max_workers=1,
+                         cancel_event=None):
+    # Chain of distinct primes q_i ≡ 1 (mod 2n) and q_i ≡ 1 (mod t).
+    # prime_bits is either one size for every prime or a list with one size per prime.
+    # Level 0 uses the product of all primes, every next level drops the last prime.
+    if levels < 1:
+        raise ValueError("The prime chain needs at least one level")
+    if isinstance(prime_bits, int):
+        prime_bits = [prime_bits] * levels
+    if len(prime_bits) != levels:
+        raise ValueError(f"Expected {levels} prime sizes, got {len(prime_bits)}")
+    if min(prime_bits) <= SIEVE_PRIME_LIMIT.bit_length():
+        raise ValueError(f"Chain primes must have more than {SIEVE_PRIME_LIMIT.bit_length()} bits")
+
+    # q ≡ 1 (mod 2n) and q ≡ 1 (mod t) <=> q ≡ 1 (mod lcm(2n, t))
+    step = math.lcm(2 * poly_degree, plaintext_modulus)
+
+    primes = []
+    attempts = 0
+    for bits in prime_bits:
+        start = 2 ** (bits - 1) + 1
+        start += (1 - start) % step
+        # Continue after the primes of the same size already in the chain
+        same_size = [p for p in primes if p.bit_length() == bits]
+        if same_size:
+            start = max(same_size) + step
+
+        prime, tried = find_prime_in_progression_parallel(start, step, max_workers=max_workers,
+                                                          cancel_event=cancel_event)
+        attempts += tried
+        if prime is None or prime.bit_length() != bits:
+            raise ValueError(f"No {bits}-bit prime ≡ 1 (mod {step}) found")
+        primes.append(prime)
+
+    moduli = [math.prod(primes[:levels - i]) for i in range(levels)]
+
+    return {
+        'modulus': moduli[0],
+        'primes': primes,
+        'moduli': moduli,
+        'roots': [find_negacyclic_root(p, poly_degree) for p in primes],
+        'poly_degree': poly_degree,
+        'attempts': attempts,
+    }
+
+
+def generate_modulus_chain(lambda_bits, plaintext_modulus, poly_degree, levels,
+                           max_workers=1, cancel_event=None):
+    # Leveled moduli with the same budget as generate_compatible_modulus: the bottom
+    # prime has the size of small_modulus and the λ+32 bits of delta are split
+    # evenly between the levels-1 primes above it.
+    # Returns (moduli from top to bottom, prime chain).
+    if levels < 2:
+        raise ValueError("The modulus chain needs at least two levels")
+
+    small_bits = max(32, lambda_bits // 2)
+    level_bits = max(SIEVE_PRIME_LIMIT.bit_length() + 1, -(-(lambda_bits + 32) // (levels - 1)))
+
+    # Sparse progressions (large lcm(2n, t)) hold few primes of that size: widen the
+    # primes until levels-1 of them are expected with room to spare
+    step = math.lcm(2 * poly_degree, plaintext_modulus)
+    while expected_primes_in_progression(level_bits, step) < CHAIN_PRIME_DENSITY * (levels - 1):
+        level_bits += 1
+
+    print(f"Generating {levels}-level modulus chain for λ={lambda_bits}, t={plaintext_modulus}, n={poly_degree}")
+    for extra_bits in range(CHAIN_EXTRA_BITS + 1):
+        try:
+            prime_chain = generate_prime_chain(
+                poly_degree, plaintext_modulus, levels, [small_bits] + [level_bits + extra_bits] * (levels - 1),
+                max_workers=max_workers, cancel_event=cancel_event
+            )
+            break
+        except ValueError:
+            if extra_bits == CHAIN_EXTRA_BITS:
+                raise
+
+    for level, modulus in enumerate(prime_chain['moduli']):
+        print(f"   Level {level}: {modulus.bit_length()} bits")
+    print(f"   Candidates tested: {prime_chain['attempts']}")
+
+    return prime_chain['moduli'], prime_chain
+
+
+def generate_modulus_chain_async(lambda_bits, plaintext_modulus, poly_degree, levels,
+                                 max_workers=None):
+    # Future for (moduli, prime chain)
+    return _submit_search(generate_modulus_chain, lambda_bits, plaintext_modulus,
+                          poly_degree, levels, max_workers=max_workers)
+
+
+def generate_special_modulus(bits, plaintext_modulus, poly_degree, coef_modulus=None,
+                             max_workers=1, cancel_event=None):
+    # Special prime P for hybrid key switching: P ≡ 1 (mod lcm(2n, t)), so dividing by P
+    # keeps the plaintext, and P coprime to coef_modulus. Returns (P, attempts).
+    if bits <= SIEVE_PRIME_LIMIT.bit_length():
+        raise ValueError(f"The special prime must have more than {SIEVE_PRIME_LIMIT.bit_length()} bits")
+
+    step = math.lcm(2 * poly_degree, plaintext_modulus)
+    attempts = 0
+    while True:
+        # Random start so P does not collide with the chain primes of the same size
+        start = getRandomNBitInteger(bits - 1) | (1 << (bits - 1))
+        start += (1 - start) % step
+        prime, tried = find_prime_in_progression_parallel(start, step, max_workers=max_workers,
+                                                          cancel_event=cancel_event)
+        attempts += tried
+        if prime is None:
+            continue
+        if prime.bit_length() == bits and (coef_modulus is None or coef_modulus % prime):
+            return prime, attempts
+
+
+def verify_prime_chain(prime_chain, plaintext_modulus, poly_degree=None):
+    # Check the per-prime properties of a chain from generate_prime_chain
+    errors = []
+    primes = prime_chain['primes']
+
+    if len(set(primes)) != len(primes):
+        errors.append("Prime chain contains repeated primes")
+
+    for i, prime in enumerate(primes):
+        if not is_probably_prime(prime):
+            errors.append(f"Chain element q_{i} ({prime}) is not prime")
+        if prime % plaintext_modulus != 1 % plaintext_modulus:
+            errors.append(f"Chain element q_{i} ({prime}) ≢ 1 (mod {plaintext_modulus})")
+        if poly_degree is not None and prime % (2 * poly_degree) != 1:
+            errors.append(f"Chain element q_{i} ({prime}) ≢ 1 (mod {2 * poly_degree}) - no negacyclic NTT")
+
+    if poly_degree is not None and 'roots' in prime_chain:
+        for i, (prime, root) in enumerate(zip(primes, prime_chain['roots'])):
+            if pow(root, poly_degree, prime) != prime - 1:
+                errors.append(f"Root {root} is not a primitive {2 * poly_degree}-th root of unity mod q_{i}")
+
+    expected_moduli = [math.prod(primes[:len(primes) - i]) for i in range(len(primes))]
+    if prime_chain.get('moduli', expected_moduli) != expected_moduli:
+        errors.append("Level moduli do not match the products of the chain primes")
+
+    return errors
+
+
+def verify_modulus_compatibility(large_modulus, small_modulus, plaintext_modulus,
+                                 prime_chain=None, poly_degree=None):
     # Verify that modulus are compatible for modulus switching
     errors = []
     
@@ -134,4 +597,12 @@ def verify_modulus_compatibility(large_modulus, small_modulus, plaintext_modulus
         if delta % plaintext_modulus != 1:
             errors.append(f"Delta ({delta}) ≢ 1 (mod {plaintext_modulus}) - this may cause switching errors")
     
+    # Check the chain the moduli were built from
+    if prime_chain is not None:
+        if prime_chain['modulus'] != large_modulus:
+            errors.append(f"Large modulus ({large_modulus}) is not the product of the prime chain")
+        if small_modulus not in prime_chain['moduli']:
+            errors.append(f"Small modulus ({small_modulus}) is not a level of the prime chain")
+        errors.extend(verify_prime_chain(prime_chain, plaintext_modulus, poly_degree))
+    
     return errors
\ No newline at end of file
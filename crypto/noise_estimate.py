@@ -0,0 +1,104 @@
+import math
+
+from core.relinearization import hybrid_digit_base, relinearization_digits
+
+# Coefficients of e are drawn from N(0, σ); 6σ bounds them in practice
+ERROR_STD = 3.8
+ERROR_SIGMAS = 6
+
+
+def switched_noise_bound(noise, delta, plaintext_modulus, degree):
+    # Worst-case noise after switching down by delta: the noise is divided by delta and
+    # the correction t * (k0 + k1*s), |k| <= delta/2 and ternary s, adds t * (1 + n) / 2
+    return noise // delta + 1 + plaintext_modulus * (1 + degree) // 2
+
+
+class NoiseEstimator:
+    # Bounds on the noise c0 + c1*s (+ c2*s^2) of a ciphertext without sk or ring products.
+    # heuristic=True bounds the canonical embedding norm ‖σ(v)‖∞, which is at least the
+    # coefficient norm ‖v‖∞ that check_ciphertext_noise measures. It is multiplicative,
+    # ‖σ(a*b)‖∞ <= ‖σ(a)‖∞ * ‖σ(b)‖∞, so products stay bounds however structured the noise
+    # gets after repeated squaring. Only the fresh random terms (encryption, key switching,
+    # rounding) are treated as independent and zero-mean: each slot of the embedding is a
+    # sum of n such terms, bounded by ERROR_SIGMAS standard deviations, and independent
+    # terms add in quadrature. Sums with an existing bound are linear.
+    # heuristic=False gives worst-case coefficient bounds (growth n, linear sums).
+
+    def __init__(self, n, plaintext_modulus, base, balanced=False, sigma=ERROR_STD,
+                 heuristic=True, key_switching='base', special_modulus=None, hybrid_digits=1):
+        self.n = n
+        self.plaintext_modulus = plaintext_modulus
+        self.base = base
+        self.balanced = balanced
+        self.sigma = sigma
+        self.heuristic = heuristic
+        self.key_switching = key_switching
+        self.special_modulus = special_modulus
+        self.hybrid_digits = hybrid_digits
+
+    def _combine(self, *terms):
+        # Bound on a sum of independent random noise terms
+        if self.heuristic:
+            return math.isqrt(sum(term * term for term in terms)) + 1
+        return sum(terms)
+
+    def _error_products(self, count, digit_bound, digit_square):
+        # Bound on Σ d_i * e_i over `count` digit polynomials: digit_bound is max |d|,
+        # digit_square the mean of d^2. A slot of d_i * e_i has variance n*E[d^2] * n*σ^2.
+        if self.heuristic:
+            return math.ceil(ERROR_SIGMAS * self.sigma * self.n * math.sqrt(count * digit_square))
+        return math.ceil(count * self.n * digit_bound * ERROR_SIGMAS * self.sigma)
+
+    def from_coefficients(self, noise):
+        # Bound of this model for a measured coefficient norm: ‖σ(v)‖∞ <= ‖v‖1 <= n‖v‖∞
+        if self.heuristic:
+            return self.n * noise
+        return noise
+
+    def fresh(self):
+        # m + t * (e*u + e0 + e1*s) with ternary u, s (E[u^2] = 1/2) and 0 <= m < t;
+        # ‖σ(m)‖∞ <= ‖m‖1 < n*t
+        t = self.plaintext_modulus
+        if self.heuristic:
+            e0 = math.ceil(t * ERROR_SIGMAS * self.sigma * math.sqrt(self.n))
+            return self._combine(e0, t * self._error_products(2, 1, 0.5)) + self.n * (t - 1)
+        e0 = math.ceil(t * ERROR_SIGMAS * self.sigma)
+        return self._combine(e0, t * self._error_products(2, 1, 0.5)) + t
+
+    def add(self, left, right):
+        return left + right
+
+    def multiply(self, left, right):
+        # The noise of the product is the ring product of the operand noises
+        if self.heuristic:
+            return left * right
+        return self.n * left * right
+
+    def relinearize(self, noise, coef_modulus):
+        # Noise after relinearization at coef_modulus: key switching adds t * Σ d_i * e_i
+        t = self.plaintext_modulus
+        if self.key_switching == 'hybrid':
+            # Digits below the hybrid base, the sum divided by P, plus the rounding to q
+            digit_base = hybrid_digit_base(coef_modulus, self.hybrid_digits)
+            added = t * self._error_products(self.hybrid_digits, digit_base - 1, digit_base ** 2 / 3)
+            return noise + self._combine(-(-added // self.special_modulus), self.rounding_noise())
+
+        digits = relinearization_digits(coef_modulus, self.base, self.balanced)
+        if self.balanced and self.base > 2:
+            digit_bound, digit_square = self.base // 2, self.base ** 2 / 12
+        else:
+            digit_bound, digit_square = self.base - 1, (self.base - 1) * (2 * self.base - 1) / 6
+        return noise + t * self._error_products(digits, digit_bound, digit_square)
+
+    def rounding_noise(self):
+        # Noise t * (k0 + k1*s) / delta left by an exact division by delta, |k| <= delta/2
+        t = self.plaintext_modulus
+        if self.heuristic:
+            # k / delta uniform in [-1/2, 1/2]: variance 1/12 per coefficient, n/12 per slot,
+            # times (1 + n/2) for k1*s
+            return math.ceil(ERROR_SIGMAS * t * math.sqrt(self.n * (1 + self.n / 2) / 12))
+        return 1 + t * (1 + self.n) // 2
+
+    def switch(self, noise, delta):
+        # Noise after switching down by delta
+        return noise // delta + 1 + self.rounding_noise()
@@ -1,55 +1,182 @@
+import math
+
 import numpy as np
 
-from core.bgv import decrypt
-from core.modulus_switch import scale2
+from core.bgv import decrypt, decrypt_ciphertext, noise_polynomial
+from core.ciphertext import Ciphertext
+from core.modulus_switch import get_switch_plan
+from core.utils import is_negacyclic, mod_center, negacyclic_row
+from crypto.noise_estimate import switched_noise_bound
+from crypto.noise_metrics import distribution_summary, noise_bits, noise_metrics
+
 
+def check_noise_level(c0, c1, sk, plaintext_modulus, key_material=None):
+    return check_ciphertext_noise((c0, c1), sk, plaintext_modulus, key_material)
 
-def check_noise_level(c0, c1, sk, plaintext_modulus):
+
+def decrypt_cached(ciphertext, sk, plaintext_modulus):
+    # (plaintext, noise) of a ciphertext with sk of its level; computed once per
+    # Ciphertext version, a ciphertext is only ever decrypted with its own key
+    def compute():
+        return decrypt_ciphertext(ciphertext, sk, plaintext_modulus, return_noise=True)
+    
+    if isinstance(ciphertext, Ciphertext):
+        return ciphertext.cached(('decrypt', plaintext_modulus), compute)
+    return compute()
+
+
+def noise_distribution(ciphertext, sk):
+    # distribution_summary of the noise coefficients with sk of the ciphertext's level,
+    # computed once per Ciphertext version
+    def compute():
+        return distribution_summary(noise_polynomial(ciphertext, sk).coef)
+    
+    if isinstance(ciphertext, Ciphertext):
+        return ciphertext.cached('noise_distribution', compute)
+    return compute()
+
+
+def noise_info_from_bound(noise, current_modulus):
+    # Noise report in bits for a measured or estimated noise magnitude at current_modulus
+    return noise_metrics(noise, current_modulus)
+
+
+def check_ciphertext_noise(ciphertext, sk, plaintext_modulus, key_material=None):
+    # Noise of a ciphertext with any number of components (not yet relinearized products too)
     try:
-        current_modulus = c0.coef_modulus
+        current_modulus = ciphertext[0].coef_modulus
         
-        if current_modulus != sk.coef_modulus:
+        if key_material is not None:
+            decrypt_sk = key_material.get_sk(current_modulus)
+        elif current_modulus != sk.coef_modulus:
             decrypt_sk = sk.copy()
             decrypt_sk.coef_modulus = current_modulus
         else:
             decrypt_sk = sk
         
-        _, noise = decrypt(c0, c1, decrypt_sk, plaintext_modulus, return_noise=True)
-        max_noise = current_modulus // 2
-        
-        noise_length = len(str(noise))
-        max_length = len(str(max_noise))
-        
-        percentage = (float(noise) / float(max_noise)) * 100 if max_noise > 0 else 100.0
-        
-        return {
-            'noise': noise,
-            'max_noise': max_noise,
-            'noise_length': noise_length,
-            'max_length': max_length,
-            'percentage': percentage,
-            'current_modulus': current_modulus
-        }
+        _, noise = decrypt_cached(ciphertext, decrypt_sk, plaintext_modulus)
+        return noise_info_from_bound(noise, current_modulus)
         
     except Exception as e:
         return {
             'noise': 0,
             'max_noise': 1,
-            'noise_length': 1,
-            'max_length': 1,
+            'noise_bits': 1,
+            'max_bits': 1,
+            'budget_bits': 0,
             'percentage': 0.0,
-            'current_modulus': c0.coef_modulus,
+            'current_modulus': ciphertext[0].coef_modulus,
             'error': str(e)
         }
 
 
-def calculate_switching_threshold_from_max_length(max_length):
-    return max(1, int(max_length * 0.63))
+def sampled_noise_bound(sample, degree, failure_probability=1e-6):
+    # Bound on the noise over all `degree` coefficients from a sample of them, violated
+    # with probability <= failure_probability if the coefficients are roughly Gaussian.
+    # σ² is bounded from the sample mean square with the χ² lower tail
+    # P(χ²_k <= k - 2√(kx)) <= e^-x, the maximum of n Gaussians by σ·√(2 ln(2n/δ)).
+    # Returns None when the sample is too small for the requested probability.
+    k = len(sample)
+    x = math.log(2 / failure_probability)
+    if k <= 4 * x:
+        return None
+    
+    mean_square = sum(int(value) * int(value) for value in sample) / k
+    variance_bound = mean_square * k / (k - 2 * math.sqrt(k * x))
+    tail = math.sqrt(2 * math.log(2 * degree / failure_probability))
+    return max(max(abs(int(value)) for value in sample), math.ceil(math.sqrt(variance_bound) * tail))
+
+
+def estimate_noise(ciphertext, sk, plaintext_modulus, samples=64, key_material=None,
+                   failure_probability=1e-6):
+    # Noise report from `samples` random coefficients of c0 + c1*s (+ c2*s^2 ...) instead of
+    # the full ring product: each coefficient is an O(n) negacyclic dot product, O(k·n) in
+    # total. 'noise' is the confidence bound of sampled_noise_bound; falls back to the full
+    # measurement when the sample would not be smaller than n or too small for the bound.
+    # key_material (KeyMaterialCache) supplies sk of the level and its powers.
+    current_modulus = ciphertext[0].coef_modulus
+    degree = ciphertext[0].degree
+    
+    def full_measurement():
+        return check_ciphertext_noise(ciphertext, sk, plaintext_modulus, key_material)
+    
+    if samples >= degree or not is_negacyclic(ciphertext[0].poly_modulus):
+        return full_measurement()
+    
+    def compute():
+        if key_material is not None:
+            powers = [key_material.get_sk_power(current_modulus, power) for power in range(1, len(ciphertext))]
+        else:
+            level_sk = sk.copy()
+            level_sk.coef_modulus = current_modulus
+            powers = [level_sk]
+            while len(powers) < len(ciphertext) - 1:
+                powers.append(powers[-1] * level_sk)
+        
+        positions = np.random.choice(degree, samples, replace=False)
+        sample = []
+        for position in positions:
+            value = ciphertext[0].coef[position]
+            for component, power in zip(ciphertext[1:], powers):
+                value += component.coef.dot(negacyclic_row(power.coef, position))
+            sample.append(mod_center(value, current_modulus))
+        return sampled_noise_bound(sample, degree, failure_probability)
+    
+    try:
+        if isinstance(ciphertext, Ciphertext):
+            noise = ciphertext.cached(('estimate_noise', samples, failure_probability), compute)
+        else:
+            noise = compute()
+    except Exception:
+        return full_measurement()
+    
+    if noise is None:
+        return full_measurement()
+    
+    noise_info = noise_info_from_bound(noise, current_modulus)
+    noise_info['sampled'] = True
+    noise_info['samples'] = samples
+    return noise_info
+
+
+def calculate_switching_threshold(max_bits, switching_ratio=0.63):
+    # Noise size in bits above which the ciphertext is switched down
+    return max(1, int(max_bits * switching_ratio))
+
+
+def dynamic_thresholds(max_bits, switching_ratio=0.63, warning_ratio=0.75, critical_ratio=0.85,
+                       gap_bits=10):
+    # Switching, warning and critical thresholds in bits of noise for q/2 of max_bits bits,
+    # at least gap_bits apart
+    switching_threshold = calculate_switching_threshold(max_bits, switching_ratio)
+    warning_threshold = max(switching_threshold + gap_bits, int(max_bits * warning_ratio))
+    critical_threshold = max(warning_threshold + gap_bits, int(max_bits * critical_ratio))
+    return switching_threshold, warning_threshold, critical_threshold
+
+
+def next_modulus_in_chain(current_modulus, moduli):
+    # Modulus one level below current_modulus, or None at the bottom / outside the chain
+    if current_modulus not in moduli:
+        return None
+    level = moduli.index(current_modulus)
+    if level + 1 >= len(moduli):
+        return None
+    return moduli[level + 1]
 
 
 def apply_modulus_switching(cryptogram_name, c0, c1, sk, small_modulus, 
-                                       large_modulus, plaintext_modulus, log_func=None):
-    # Apply modulus switching
+                                       large_modulus, plaintext_modulus, log_func=None,
+                                       moduli=None, force=False, key_material=None,
+                                       noise_bound=None, verify=False,
+                                       switching_ratio=0.63, critical_ratio=0.85, noise_estimator=None):
+    # Apply modulus switching one level down the chain (large -> small without a chain).
+    # force=True switches even when the noise is still below the switching threshold.
+    # key_material (KeyMaterialCache) supplies already reduced secret keys and switching plans.
+    # noise_bound: known bound on the noise; the decision then needs no decryption.
+    # noise_estimator: the NoiseEstimator whose tracked bound noise_bound is, None for a
+    # measured coefficient norm.
+    # verify=True (debug) decrypts before and after the switch and compares the plaintexts.
+    # switching_ratio, critical_ratio: thresholds as fractions of the bits of q/2.
 
     def log(message):
         if log_func:
@@ -57,70 +184,97 @@ def apply_modulus_switching(cryptogram_name, c0, c1, sk, small_modulus,
         else:
             print(message)
     
+    def level_sk(modulus):
+        if key_material is not None:
+            return key_material.get_sk(modulus)
+        if sk.coef_modulus == modulus:
+            return sk
+        reduced_sk = sk.copy()
+        reduced_sk.coef_modulus = modulus
+        return reduced_sk
+    
+    if moduli is None:
+        moduli = [large_modulus, small_modulus]
+    
     try:
         current_modulus = c0.coef_modulus
+        target_small_modulus = next_modulus_in_chain(current_modulus, moduli)
         
-        if current_modulus == large_modulus:
-            decrypt_sk = sk
-            target_small_modulus = small_modulus
-        else:
+        if target_small_modulus is None:
             return c0, c1, False
         
-        noise_info = check_noise_level(c0, c1, decrypt_sk, plaintext_modulus)
+        if noise_bound is not None:
+            noise_info = noise_info_from_bound(noise_bound, current_modulus)
+        else:
+            noise_info = check_noise_level(c0, c1, level_sk(current_modulus), plaintext_modulus)
+        
+        # Thresholds in bits of the noise relative to the bits of q/2
+        max_bits = noise_info['max_bits']
+        switching_threshold = calculate_switching_threshold(max_bits, switching_ratio)
+        critical_threshold = int(max_bits * critical_ratio)
         
-        # applying switching - 63% from max_length
-        switching_threshold = calculate_switching_threshold_from_max_length(noise_info['max_length'])
-        critical_threshold = int(noise_info['max_length'] * 0.85)  # 85% from max
+        log(f"   • Шум: {noise_info['noise_bits']} бита (остават {noise_info['budget_bits']} бита)")
+        log(f"   • Switching праг: {switching_threshold} бита ({switching_ratio:.0%} от {max_bits})")
+        log(f"   • Критичен праг: {critical_threshold} бита ({critical_ratio:.0%} от {max_bits})")
         
-        log(f"   • Шум: {noise_info['noise_length']} числа")
-        log(f"   • Switching праг: {switching_threshold} (63% от {noise_info['max_length']})")
-        log(f"   • Критичен праг: {critical_threshold} (85% от {noise_info['max_length']})")
+        if not force and noise_info['noise_bits'] <= switching_threshold:
+            log(f"✅ Шумът е OK ({noise_info['noise_bits']} <= {switching_threshold} бита)")
+            return c0, c1, False
         
-        if noise_info['noise_length'] > switching_threshold:
-            if noise_info['noise_length'] <= critical_threshold:
-                try:
-                    temp_decrypt, _ = decrypt(c0, c1, decrypt_sk, plaintext_modulus, return_noise=True)
-                    
-                    c0_switched = scale2(c0, large_modulus, target_small_modulus, plaintext_modulus)
-                    c1_switched = scale2(c1, large_modulus, target_small_modulus, plaintext_modulus)
-                    
-                    c0_switched.coef_modulus = target_small_modulus
-                    c1_switched.coef_modulus = target_small_modulus
-                    
-                    temp_sk = sk.copy()
-                    temp_sk.coef_modulus = target_small_modulus
-                    
-                    new_decrypt, new_noise = decrypt(c0_switched, c1_switched, temp_sk, plaintext_modulus, return_noise=True)
-                    new_noise_length = len(str(new_noise))
-                    
-                    matches = np.sum(temp_decrypt.coef == new_decrypt.coef)
-                    match_ratio = matches / len(temp_decrypt.coef)
-                    
-                    log(f"   • Съвпадение: {match_ratio*100:.1f}% коефициенти")
-                    
-                    if match_ratio >= 0.7:
-                        log(f"✅ Шумът е успешно редуциран!")
-                        log(f"   • Стар шум: {noise_info['noise_length']} числа")
-                        log(f"   • Нов шум: {new_noise_length} числа")
-                        log(f"   • Запазени: {match_ratio*100:.1f}% коефициенти")
-                        
-                        return c0_switched, c1_switched, True
-                    else:
-                        log(f"❌ Switching се провали - само {match_ratio*100:.1f}% съвпадение")
-                        log(f"   • Оригинал: {temp_decrypt.coef}")
-                        log(f"   • След switching: {new_decrypt.coef}")
-                        return c0, c1, False
-                        
-                except Exception as e:
-                    log(f"❌ Грешка в switching: {str(e)}")
-                    return c0, c1, False
+        if noise_info['noise_bits'] > critical_threshold:
+            log(f"❌ Твърде висок шум за switching ({noise_info['noise_bits']} > {critical_threshold} бита)")
+            return c0, c1, False
+        
+        try:
+            if key_material is not None:
+                switch_plan = key_material.get_switch_plan(current_modulus, target_small_modulus)
             else:
-                log(f"❌ Твърде висок шум за switching ({noise_info['noise_length']} > {critical_threshold})")
+                switch_plan = get_switch_plan(current_modulus, target_small_modulus, plaintext_modulus)
+            c0_switched, c1_switched = switch_plan.scale_ciphertext((c0, c1))
+            
+            if not verify:
+                # Below the critical threshold the switched ciphertext decrypts correctly.
+                # The new bound follows the rule of the old one: the estimator of a tracked
+                # bound, else the worst case for a measured coefficient norm
+                if noise_estimator is not None:
+                    new_bound = noise_estimator.switch(noise_info['noise'], switch_plan.delta)
+                    units = "оценка"
+                else:
+                    new_bound = switched_noise_bound(noise_info['noise'], switch_plan.delta,
+                                                     plaintext_modulus, len(c0.coef))
+                    units = "по коефициенти"
+                log(f"✅ Шумът е редуциран!")
+                log(f"   • Стар шум ({units}): {noise_info['noise_bits']} бита")
+                log(f"   • Нов шум ({units}): до {noise_bits(new_bound)} бита")
+                return c0_switched, c1_switched, True
+            
+            old_decrypt = decrypt(c0, c1, level_sk(current_modulus), plaintext_modulus)
+            new_decrypt, new_noise = decrypt(c0_switched, c1_switched, level_sk(target_small_modulus),
+                                             plaintext_modulus, return_noise=True)
+            new_noise_bits = noise_bits(new_noise)
+            
+            matches = np.sum(old_decrypt.coef == new_decrypt.coef)
+            match_ratio = matches / len(old_decrypt.coef)
+            
+            log(f"   • Съвпадение: {match_ratio*100:.1f}% коефициенти")
+            
+            if match_ratio >= 0.7:
+                log(f"✅ Шумът е успешно редуциран!")
+                log(f"   • Стар шум: {noise_info['noise_bits']} бита")
+                log(f"   • Нов шум: {new_noise_bits} бита")
+                log(f"   • Запазени: {match_ratio*100:.1f}% коефициенти")
+                
+                return c0_switched, c1_switched, True
+            else:
+                log(f"❌ Switching се провали - само {match_ratio*100:.1f}% съвпадение")
+                log(f"   • Оригинал: {old_decrypt.coef}")
+                log(f"   • След switching: {new_decrypt.coef}")
                 return c0, c1, False
-        else:
-            log(f"✅ Шумът е OK ({noise_info['noise_length']} <= {switching_threshold})")
+                
+        except Exception as e:
+            log(f"❌ Грешка в switching: {str(e)}")
             return c0, c1, False
             
     except Exception as e:
         log(f"❌ Глобална грешка: {str(e)}")
-        return c0, c1, False
\ No newline at end of file
+        return c0, c1, False
@@ -0,0 +1,51 @@
+import math
+
+import numpy as np
+
+
+def noise_bits(noise) -> int:
+    # Bits of the noise magnitude, 0 for no noise
+    return abs(int(noise)).bit_length()
+
+
+def noise_metrics(noise, coef_modulus):
+    # Noise report in bits for a measured or estimated noise magnitude at coef_modulus
+    max_noise = coef_modulus // 2
+    used_bits = noise_bits(noise)
+    max_bits = max_noise.bit_length()
+
+    return {
+        'noise': noise,
+        'max_noise': max_noise,
+        'noise_bits': used_bits,
+        'max_bits': max_bits,
+        'budget_bits': max_bits - used_bits,
+        'percentage': 100.0 * used_bits / max_bits if max_bits > 0 else 100.0,
+        'current_modulus': coef_modulus
+    }
+
+
+# Element-wise int.bit_length on object arrays
+_bit_lengths = np.frompyfunc(lambda value: int(value).bit_length(), 1, 1)
+
+
+def distribution_summary(coefs):
+    # Bit lengths of all noise coefficients: how the noise is spread, not only its maximum.
+    # histogram[b] = number of coefficients with b bits
+    magnitudes = np.abs(np.asarray(coefs, dtype=object))
+    bits = _bit_lengths(magnitudes).astype(np.int64)
+    if bits.size == 0:
+        return {'max_bits': 0, 'mean_bits': 0.0, 'median_bits': 0.0, 'rms_bits': 0.0,
+                'histogram': np.zeros(1, dtype=np.int64)}
+
+    # log2 of the root mean square, summed exactly as Python integers
+    mean_square = int((magnitudes * magnitudes).sum()) // bits.size
+    rms_bits = math.log2(mean_square) / 2 if mean_square > 0 else 0.0
+
+    return {
+        'max_bits': int(bits.max()),
+        'mean_bits': float(bits.mean()),
+        'median_bits': float(np.median(bits)),
+        'rms_bits': rms_bits,
+        'histogram': np.bincount(bits)
+    }
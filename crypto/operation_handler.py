@@ -1,41 +1,387 @@
-from core.operations import add, mul
+from core.bgv import encrypt
+from core.ciphertext import Ciphertext
+from core.operations import add_ciphertexts, mul
 from core.polynomial import QuotientRingPoly
-from core.relinearization import gen_relinearization_key, relinearize
-from crypto.noise_management import apply_modulus_switching, check_noise_level
+from core.relinearization import hybrid_special_modulus_bits, relinearize, relinearize_hybrid
+from crypto.circuit_planner import BLOCKED_AFTER, CircuitPlanner
+from crypto.cost_model import recommend_base
+from crypto.key_material import KeyMaterialCache
+from crypto.modulus_compatibility import generate_special_modulus
+from crypto.noise_estimate import NoiseEstimator
+from crypto.noise_management import (apply_modulus_switching, check_ciphertext_noise, dynamic_thresholds,
+                                     estimate_noise, noise_info_from_bound)
+from crypto.parallel_relinearization import ParallelRelinearizer
+from crypto.switching_scheduler import SwitchingScheduler
 
 
 class OperationHandler:
     # Operation handler class
     
     def __init__(self, sk, coef_modulus, small_modulus, poly_modulus, 
-                 plaintext_modulus, base=5):
+                 plaintext_modulus, base=5, moduli=None, lazy_relinearization=True,
+                 key_switching='base', special_modulus=None, hybrid_digits=1,
+                 balanced_digits=False, relinearization_workers=1,
+                 relinearization_executor='process', relinearization_min_digits=8,
+                 verify_switching=False, noise_estimation='heuristic',
+                 switching_ratio=0.63, warning_ratio=0.75, critical_ratio=0.85,
+                 threshold_gap_bits=10, noise_samples=64, noise_failure_probability=1e-6,
+                 switching_policy='scheduled', switching_min_gain_bits=10, switching_margin_bits=10,
+                 planning_margin_bits=10, public_key=None):
         self.sk = sk
         self.coef_modulus = coef_modulus
         self.small_modulus = small_modulus
         self.poly_modulus = poly_modulus
         self.plaintext_modulus = plaintext_modulus
-        self.base = base
         self.eks = None
+        # Keep products as 3-component ciphertexts until relinearization is required
+        self.lazy_relinearization = lazy_relinearization
+        # Check every modulus switch by decrypting before and after (debug mode)
+        self.verify_switching = verify_switching
+        
+        # Modulus chain, level 0 = coef_modulus; every level divides the one above
+        self.moduli = list(moduli) if moduli else [coef_modulus, small_modulus]
+        if self.moduli[0] != coef_modulus:
+            raise ValueError("Веригата от модули трябва да започва с coef_modulus.")
+        for upper, lower in zip(self.moduli, self.moduli[1:]):
+            if upper % lower != 0:
+                raise ValueError(f"Модулът {lower} не дели модула {upper} от по-горното ниво.")
+        
+        # Signed digits in [-base/2, base/2) for the base decomposition
+        self.balanced_digits = balanced_digits
+        
+        # Noise thresholds as fractions of the bits of q/2
+        self.switching_ratio = switching_ratio   # switching
+        self.warning_ratio = warning_ratio       # warning
+        self.critical_ratio = critical_ratio     # blocking
+        # Minimal distance in bits between consecutive thresholds
+        self.threshold_gap_bits = threshold_gap_bits
+        
+        # base='auto': cost-model choice, one squaring per level of the chain, switched and
+        # checked against the critical threshold as at runtime
+        if base == 'auto':
+            base = recommend_base(len(poly_modulus) - 1, coef_modulus, plaintext_modulus,
+                                  depth=max(1, len(self.moduli) - 1), balanced=balanced_digits,
+                                  heuristic=noise_estimation == 'heuristic', moduli=self.moduli,
+                                  thresholds=self.calculate_dynamic_thresholds,
+                                  critical_ratio=critical_ratio, min_gain_bits=switching_min_gain_bits,
+                                  margin_bits=switching_margin_bits)['base']
+        self.base = base
+        
+        # Key switching: 'base' = digit decomposition in `base`, 'hybrid' = hybrid_digits
+        # large digits over coef_modulus * special_modulus
+        if key_switching not in ('base', 'hybrid'):
+            raise ValueError(f"Неизвестен метод за key switching: {key_switching}")
+        self.key_switching = key_switching
+        self.hybrid_digits = hybrid_digits
+        self.special_modulus = special_modulus
+        if key_switching == 'hybrid' and special_modulus is None:
+            # One P sized for the top level also covers every lower level
+            bits = hybrid_special_modulus_bits(coef_modulus, len(poly_modulus) - 1, hybrid_digits)
+            self.special_modulus, _ = generate_special_modulus(bits, plaintext_modulus,
+                                                               len(poly_modulus) - 1, coef_modulus)
+        
+        # Per-level key material, filled on first use of a level or by warm_up_key_material()
+        self.key_material = KeyMaterialCache(sk, self.moduli, poly_modulus, plaintext_modulus, self.base,
+                                             key_switching, self.special_modulus, hybrid_digits,
+                                             balanced_digits, public_key)
         
-        self.switching_ratio = 0.63   # 63% from max_length for switching
-        self.warning_ratio = 0.75     # 75% from max_length for warning
-        self.critical_ratio = 0.85    # 85% from max_length for blocking
+        # Digit chunks of the base decomposition spread over a pool; 1 = sequential, 0 = one per core
+        self.parallel_relinearizer = None
+        if relinearization_workers != 1 and key_switching == 'base':
+            self.parallel_relinearizer = ParallelRelinearizer(relinearization_workers or None,
+                                                              relinearization_executor,
+                                                              relinearization_min_digits)
         
-    def calculate_dynamic_thresholds(self, max_length):
-        # Calculates dynamic thresholds на max_length"""
-        switching_threshold = max(1, int(max_length * self.switching_ratio))  # 63% from max_length
-        warning_threshold = max(switching_threshold + 3, int(max_length * self.warning_ratio))
-        critical_threshold = max(warning_threshold + 3, int(max_length * self.critical_ratio))
+        # Noise bounds carried by every Ciphertext, updated by closed-form rules instead of
+        # decryption; 'measure' decrypts with sk as before
+        if noise_estimation not in ('heuristic', 'worst_case', 'measure'):
+            raise ValueError(f"Неизвестен метод за оценка на шума: {noise_estimation}")
+        self.noise_estimator = None
+        if noise_estimation != 'measure':
+            self.noise_estimator = NoiseEstimator(len(poly_modulus) - 1, plaintext_modulus, self.base,
+                                                  balanced_digits, heuristic=noise_estimation == 'heuristic',
+                                                  key_switching=key_switching,
+                                                  special_modulus=self.special_modulus,
+                                                  hybrid_digits=hybrid_digits)
+        # Rules for predicting noise (scheduling, planning); heuristic when noise is measured
+        self.noise_model = self.noise_estimator or NoiseEstimator(
+            len(poly_modulus) - 1, plaintext_modulus, self.base, balanced_digits,
+            key_switching=key_switching, special_modulus=self.special_modulus, hybrid_digits=hybrid_digits
+        )
         
-        return switching_threshold, warning_threshold, critical_threshold
+        # Noise checks without a tracked bound sample this many coefficients (0 = all of them);
+        # full measurement is left to explicit decryption
+        self.noise_samples = noise_samples
+        self.noise_failure_probability = noise_failure_probability
+        
+        # Simulates planned operations on the noise bounds, created on first use
+        self.circuit_planner = None
+        
+        # Distance every planned step must keep below the critical threshold in level_for_depth
+        self.planning_margin_bits = planning_margin_bits
+        
+        # 'scheduled' = switch both operands of a product where it gains budget, with the
+        # ratio rule as fallback; 'threshold' = ratio rule before and after every operation
+        if switching_policy not in ('scheduled', 'threshold'):
+            raise ValueError(f"Неизвестна стратегия за modulus switching: {switching_policy}")
+        self.switching_scheduler = None
+        if switching_policy == 'scheduled':
+            self.switching_scheduler = SwitchingScheduler(
+                self.moduli, self.noise_model,
+                lambda max_bits: self.calculate_dynamic_thresholds(max_bits)[0],
+                critical_ratio, switching_min_gain_bits, switching_margin_bits
+            )
+        
+    def calculate_dynamic_thresholds(self, max_bits):
+        # Switching, warning and critical thresholds in bits of noise for q/2 of max_bits bits
+        return dynamic_thresholds(max_bits, self.switching_ratio, self.warning_ratio, self.critical_ratio,
+                                  self.threshold_gap_bits)
         
     def generate_relinearization_keys(self):
         # Generate relinearization keys if not already generated
         if self.eks is None:
-            self.eks = gen_relinearization_key(
-                self.sk, self.base, self.coef_modulus, 
-                self.poly_modulus, self.plaintext_modulus
-            )
+            self.eks = self.key_material.get_relinearization_keys(self.coef_modulus)
+    
+    def warm_up_key_material(self, background=True):
+        # Precompute reduced keys and relinearization keys for all levels
+        return self.key_material.warm_up(background)
+    
+    def invalidate_key_material(self, sk=None, public_key=None):
+        # Forget cached key material, optionally switching to a new key pair
+        if sk is not None:
+            self.sk = sk
+        self.eks = None
+        self.key_material.invalidate(sk, public_key)
+        if self.parallel_relinearizer is not None:
+            self.parallel_relinearizer.release_keys()
+    
+    def shutdown(self):
+        # Release cached keys and stop the relinearization pool
+        self.invalidate_key_material()
+        if self.parallel_relinearizer is not None:
+            self.parallel_relinearizer.close()
+    
+    @property
+    def num_levels(self):
+        return len(self.moduli)
+    
+    def get_level(self, c0):
+        # Level of a ciphertext component in the modulus chain
+        try:
+            return self.moduli.index(c0.coef_modulus)
+        except ValueError:
+            raise ValueError(f"Модулът {c0.coef_modulus} не е част от веригата от модули.")
+    
+    def get_level_sk(self, modulus):
+        # Secret key reduced to the given level
+        return self.key_material.get_sk(modulus)
+    
+    def get_relinearization_keys(self, modulus):
+        # Relinearization keys for the given level
+        if modulus == self.coef_modulus:
+            self.generate_relinearization_keys()
+            return self.eks
+        return self.key_material.get_relinearization_keys(modulus)
+    
+    def relinearize_ciphertext(self, ciphertext):
+        # Reduce a 3-component ciphertext to 2 components with the keys of its level
+        if len(ciphertext) == 2:
+            return ciphertext
+        if len(ciphertext) != 3:
+            raise ValueError(f"Релинеаризация на {len(ciphertext)} компонента не се поддържа.")
+        
+        c0, c1, c2 = ciphertext
+        current_modulus = c0.coef_modulus
+        level_eks = self.get_relinearization_keys(current_modulus)
+        if self.key_switching == 'hybrid':
+            return relinearize_hybrid(c0, c1, c2, level_eks, current_modulus, self.special_modulus,
+                                      self.poly_modulus, self.plaintext_modulus,
+                                      self.key_material.get_key_switching_plan(current_modulus))
+        if self.parallel_relinearizer is not None and len(level_eks) >= self.parallel_relinearizer.min_digits:
+            return self.parallel_relinearizer.relinearize(c0, c1, c2, level_eks, self.base, current_modulus,
+                                                          self.poly_modulus, self.balanced_digits)
+        return relinearize(c0, c1, c2, level_eks, self.base, current_modulus, self.poly_modulus,
+                           self.balanced_digits)
+    
+    def new_ciphertext(self, c0, c1):
+        # Ciphertext of a fresh encryption, with its noise bound when noise is tracked
+        estimate = self.noise_estimator.fresh() if self.noise_estimator is not None else None
+        return Ciphertext((c0, c1), estimate)
+    
+    def encrypt_at_level(self, values, level=0):
+        # Fresh encryption of the coefficient values directly under the modulus of `level`,
+        # with the public key reduced to that level
+        modulus = self.moduli[level]
+        pk0, pk1 = self.key_material.get_public_key(modulus)
+        msg = QuotientRingPoly(values, modulus, self.poly_modulus)
+        return self.new_ciphertext(*encrypt(msg, pk0, pk1, modulus, self.poly_modulus, self.plaintext_modulus))
+    
+    def level_for_depth(self, depth):
+        # Lowest level (smallest modulus) at which a fresh ciphertext still completes `depth`
+        # consecutive squarings, the noisiest circuit of that multiplicative depth, with every
+        # step at least planning_margin_bits below its critical threshold
+        steps = [('X', '*', 'X', 'D1')] + [(f"D{i}", '*', f"D{i}", f"D{i + 1}") for i in range(1, depth)]
+        for level in reversed(range(self.num_levels)):
+            if not depth:
+                return level
+            plan = self.plan_operations(steps, input_level=level)
+            if plan['feasible'] and all(
+                    self.calculate_dynamic_thresholds(step['max_bits'])[2] - step['noise_bits']
+                    >= self.planning_margin_bits for step in plan['steps']):
+                return level
+        return 0
+    
+    def noise_info(self, ciphertext):
+        # Noise report from the tracked bound, or sampled with sk when none is tracked
+        estimate = getattr(ciphertext, 'noise_estimate', None)
+        if self.noise_estimator is not None and estimate is not None:
+            noise_info = noise_info_from_bound(estimate, ciphertext[0].coef_modulus)
+            noise_info['estimated'] = True
+            return noise_info
+        if self.noise_samples:
+            return estimate_noise(ciphertext, self.sk, self.plaintext_modulus, self.noise_samples,
+                                  self.key_material, self.noise_failure_probability)
+        return check_ciphertext_noise(ciphertext, self.sk, self.plaintext_modulus, self.key_material)
+    
+    def model_noise(self, ciphertext):
+        # Noise in the units of noise_model: the tracked bound, else the measured or sampled
+        # coefficient norm converted to the model
+        estimate = getattr(ciphertext, 'noise_estimate', None)
+        if estimate is not None:
+            return estimate
+        return self.noise_model.from_coefficients(self.noise_info(ciphertext)['noise'])
+    
+    def relinearize_stored(self, cryptogram_name, encrypted_values, log_func=None):
+        # Relinearize a stored ciphertext in place; returns the 2-component ciphertext
+        ciphertext = Ciphertext.wrap(encrypted_values[cryptogram_name])
+        if len(ciphertext) == 2:
+            return ciphertext
+        
+        estimate = ciphertext.noise_estimate
+        if estimate is not None:
+            estimate = self.noise_estimator.relinearize(estimate, ciphertext.coef_modulus)
+        ciphertext = ciphertext.derive(self.relinearize_ciphertext(ciphertext), estimate)
+        encrypted_values[cryptogram_name] = ciphertext
+        if log_func:
+            log_func(f"   • Отложена релинеаризация на {cryptogram_name}")
+        return ciphertext
+    
+    def switch_to_next_level(self, cryptogram_name, c0, c1, log_func=None, force=False, noise_bound=None,
+                             noise_estimator=None):
+        # Noise-checked modulus switching one level down the chain; noise_estimator is given
+        # when noise_bound is its tracked bound
+        return apply_modulus_switching(
+            cryptogram_name, c0, c1, self.sk, self.small_modulus,
+            self.coef_modulus, self.plaintext_modulus, log_func,
+            moduli=self.moduli, force=force, key_material=self.key_material,
+            noise_bound=noise_bound, verify=self.verify_switching,
+            switching_ratio=self.switching_ratio, critical_ratio=self.critical_ratio,
+            noise_estimator=noise_estimator
+        )
+    
+    def switch_stored(self, cryptogram_name, encrypted_values, log_func=None, force=False, noise_bound=None):
+        # Relinearize and switch a stored ciphertext one level down; the tracked noise bound
+        # drives the decision unless noise_bound is given. Returns whether it was switched.
+        ciphertext = self.relinearize_stored(cryptogram_name, encrypted_values, log_func)
+        estimate = ciphertext.noise_estimate
+        noise_estimator = None
+        if noise_bound is None and estimate is not None:
+            noise_bound, noise_estimator = estimate, self.noise_estimator
+        if noise_bound is None and self.noise_samples:
+            noise_info = self.noise_info(ciphertext)
+            if 'error' not in noise_info:
+                noise_bound = noise_info['noise']
+        
+        new_c0, new_c1, switched = self.switch_to_next_level(
+            cryptogram_name, ciphertext[0], ciphertext[1], log_func, force, noise_bound, noise_estimator
+        )
+        if switched:
+            if estimate is not None:
+                estimate = self.noise_estimator.switch(estimate, ciphertext.coef_modulus // new_c0.coef_modulus)
+            encrypted_values[cryptogram_name] = ciphertext.derive((new_c0, new_c1), estimate)
+        return switched
+    
+    def switch_batch(self, cryptogram_names, encrypted_values, log_func=None):
+        # Switch stored ciphertexts of the same level one level down with one pass of the
+        # precomputed plan over all their components; the caller has checked the noise
+        ciphertexts = [self.relinearize_stored(name, encrypted_values, log_func) for name in cryptogram_names]
+        current_modulus = ciphertexts[0].coef_modulus
+        switch_plan = self.key_material.get_switch_plan(current_modulus)
+        if switch_plan is None:
+            return False
+        
+        components = switch_plan.scale_ciphertext([c for ciphertext in ciphertexts for c in ciphertext])
+        for index, (name, ciphertext) in enumerate(zip(cryptogram_names, ciphertexts)):
+            estimate = ciphertext.noise_estimate
+            if estimate is not None:
+                estimate = self.noise_estimator.switch(estimate, switch_plan.delta)
+            encrypted_values[name] = ciphertext.derive(components[2 * index:2 * index + 2], estimate)
+        if log_func:
+            log_func(f"   • Modulus switching на {', '.join(cryptogram_names)} "
+                     f"към ниво {self.moduli.index(switch_plan.small_mod)}")
+        return True
+    
+    def align_levels(self, left_operand, right_operand, encrypted_values, log_func=None):
+        # Switch the operand higher up the chain straight down to the level of the other one,
+        # with the precomputed plan for that modulus pair. Independent of the noise, so
+        # without a threshold check or trial decryption; the result check catches the rest.
+        left_level = self.get_level(encrypted_values[left_operand][0])
+        right_level = self.get_level(encrypted_values[right_operand][0])
+        if left_level == right_level:
+            return
+        name, level, target = ((left_operand, left_level, right_level) if left_level < right_level
+                               else (right_operand, right_level, left_level))
+        
+        ciphertext = self.relinearize_stored(name, encrypted_values, log_func)
+        switch_plan = self.key_material.get_switch_plan(self.moduli[level], self.moduli[target])
+        estimate = ciphertext.noise_estimate
+        if estimate is not None:
+            estimate = self.noise_estimator.switch(estimate, switch_plan.delta)
+        encrypted_values[name] = ciphertext.derive(switch_plan.scale_ciphertext(ciphertext), estimate)
+        if log_func:
+            log_func(f"   • Изравняване на нивата: {name} от ниво {level} към ниво {target}")
+    
+    def apply_scheduled_switching(self, left_operand, operation, right_operand, encrypted_values, log_func=None):
+        # Switching before an operation: the scheduler moves both operands of a product to
+        # a common level, everything else falls back to the ratio rule
+        operands = list(dict.fromkeys((left_operand, right_operand)))
+        if self.switching_scheduler is None or operation != '*':
+            for operand in operands:
+                self.check_and_apply_auto_switching(operand, encrypted_values[operand], encrypted_values, log_func)
+            return
+        
+        ciphertexts = {name: self.relinearize_stored(name, encrypted_values, log_func) for name in operands}
+        noise = {name: self.model_noise(ciphertext) for name, ciphertext in ciphertexts.items()}
+        levels = {name: self.get_level(ciphertext[0]) for name, ciphertext in ciphertexts.items()}
+        target = self.switching_scheduler.multiplication_level(
+            noise[left_operand], levels[left_operand], noise[right_operand], levels[right_operand]
+        )
+        
+        # Bring the operands down together, level by level from the highest one
+        while min(levels.values()) < target:
+            top = min(levels.values())
+            batch = [name for name in operands if levels[name] == top]
+            if self.verify_switching:
+                switched = all([self.switch_stored(name, encrypted_values, log_func, force=True) for name in batch])
+            else:
+                switched = self.switch_batch(batch, encrypted_values, log_func)
+            if not switched:
+                break
+            for name in batch:
+                levels[name] += 1
+    
+    def apply_result_switching(self, cryptogram_name, ciphertext, encrypted_values, log_func=None):
+        # Results are switched when they are used by a product, unless only the ratio rule applies
+        if self.switching_scheduler is None:
+            return self.check_and_apply_auto_switching(cryptogram_name, ciphertext, encrypted_values, log_func)
+        return False
+    
+    def plan_operations(self, steps, encrypted_values=None, input_level=0):
+        # Simulate planned operations (tuples or operation_history entries) on noise bounds
+        # without touching ciphertexts; see CircuitPlanner.plan
+        if self.circuit_planner is None:
+            self.circuit_planner = CircuitPlanner(self)
+        return self.circuit_planner.plan(steps, encrypted_values, input_level)
     
     def get_operation_depth(self, cryptogram_name, operation_history, original_values):
         # Calculate the multiplicative depth of a cryptogram
@@ -94,46 +440,59 @@ class OperationHandler:
                 right_depth = 0
             
             # Check noise levels for both operands
-            max_noise_length = 0
+            max_noise_bits = 0
             critical_operand = None
-            max_allowed_length = 0
+            max_allowed_bits = 0
             
             for operand in [left_operand, right_operand]:
                 try:
-                    c0, c1 = encrypted_values[operand]
-                    noise_info = check_noise_level(c0, c1, self.sk, self.plaintext_modulus)
+                    noise_info = self.noise_info(encrypted_values[operand])
                     
-                    if noise_info['noise_length'] > max_noise_length:
-                        max_noise_length = noise_info['noise_length']
+                    if noise_info['noise_bits'] > max_noise_bits:
+                        max_noise_bits = noise_info['noise_bits']
                         critical_operand = operand
-                        max_allowed_length = noise_info['max_length']
+                        max_allowed_bits = noise_info['max_bits']
                         
                 except Exception as noise_error:
                     # If we can't check noise, assume worst case
-                    max_noise_length = 100
+                    max_noise_bits = 300
                     critical_operand = operand
-                    max_allowed_length = 100
+                    max_allowed_bits = 300
             
-            switching_threshold, warning_threshold, critical_threshold = self.calculate_dynamic_thresholds(max_allowed_length)
+            switching_threshold, warning_threshold, critical_threshold = self.calculate_dynamic_thresholds(max_allowed_bits)
             
             # Check if operation should be blocked
-            if max_noise_length > critical_threshold:
+            if max_noise_bits > critical_threshold:
                 can_perform = False
                 if log:
                     log("🚫 ОПЕРАЦИЯТА НЕ МОЖЕ ДА БЪДЕ ИЗПЪЛНЕНА!")
-                    log(f"   Критична дължина на шума в {critical_operand}: {max_noise_length} числа")
-                    log(f"   Макс дължина: {max_allowed_length} числа")
-                    log(f"   Критичен праг: {critical_threshold} числа (85% от {max_allowed_length})")
-                    log(f"   Switching праг: {switching_threshold} числа (63% от {max_allowed_length})")
+                    log(f"   Критичен шум в {critical_operand}: {max_noise_bits} бита")
+                    log(f"   Максимум: {max_allowed_bits} бита")
+                    log(f"   Критичен праг: {critical_threshold} бита ({self.critical_ratio:.0%} от {max_allowed_bits})")
+                    log(f"   Switching праг: {switching_threshold} бита ({self.switching_ratio:.0%} от {max_allowed_bits})")
                     if new_depth > 0:
                         log(f"   Дълбочина: {new_depth} (информативно)")
             
+            # Refuse an operation whose result perform_operation would compute and then
+            # discard; exact when both operands carry the bounds perform_operation uses
+            if can_perform and self.noise_estimator is not None and all(
+                    getattr(encrypted_values[operand], 'noise_estimate', None) is not None
+                    for operand in (left_operand, right_operand)):
+                failure = self.plan_operations([(left_operand, operation, right_operand)],
+                                               encrypted_values)['first_failure']
+                if failure is not None and failure['failure'] == BLOCKED_AFTER:
+                    can_perform = False
+                    if log:
+                        log("🚫 ОПЕРАЦИЯТА НЕ МОЖЕ ДА БЪДЕ ИЗПЪЛНЕНА!")
+                        log(f"   Шумът в резултата би бил {failure['noise_bits']} бита "
+                            f"от {failure['max_bits']} (над критичния праг)")
+            
             # Check for warnings
-            if can_perform and max_noise_length > warning_threshold:
+            if can_perform and max_noise_bits > warning_threshold:
                 warnings.append({
                     'type': 'high_noise',
                     'operand': critical_operand,
-                    'noise_length': max_noise_length,
+                    'noise_bits': max_noise_bits,
                     'threshold': warning_threshold,
                     'depth': new_depth
                 })
@@ -142,7 +501,7 @@ class OperationHandler:
                 'new_depth': new_depth,
                 'left_depth': left_depth,
                 'right_depth': right_depth,
-                'max_noise_length': max_noise_length,
+                'max_noise_bits': max_noise_bits,
                 'critical_operand': critical_operand,
                 'switching_threshold': switching_threshold,
                 'warning_threshold': warning_threshold,
@@ -157,117 +516,99 @@ class OperationHandler:
     
     def perform_operation(self, left_operand, operation, right_operand, 
                          encrypted_values, log_func=None):
-        # Perform the actual cryptographic operation.
+        # Perform the actual cryptographic operation; the result is a Ciphertext
+        # carrying its noise bound when both operands carry one
         
         def log(message):
             if log_func:
                 log_func(message)
         
         try:
-            c0_left, c1_left = encrypted_values[left_operand]
-            c0_right, c1_right = encrypted_values[right_operand]
-            
-            # Check modulus compatibility
-            left_modulus = c0_left.coef_modulus
-            right_modulus = c0_right.coef_modulus
+            # Products and level switches need relinearized operands
+            if operation == "*":
+                self.relinearize_stored(left_operand, encrypted_values, log_func)
+                self.relinearize_stored(right_operand, encrypted_values, log_func)
+
+            # Handle modulus mismatch: bring the higher-level operand down the chain
+            self.align_levels(left_operand, right_operand, encrypted_values, log_func)
+            left = Ciphertext.wrap(encrypted_values[left_operand])
+            right = Ciphertext.wrap(encrypted_values[right_operand])
             
-            # Handle modulus mismatch
-            if left_modulus != right_modulus:
-                # Try to bring both to the same modulus
-                if left_modulus == self.coef_modulus and right_modulus != self.coef_modulus:
-                    # Left is large, right is small - bring left to small
-                    c0_left, c1_left, switched = apply_modulus_switching(
-                        left_operand, c0_left, c1_left, self.sk, self.small_modulus, 
-                        self.coef_modulus, self.plaintext_modulus, log_func
-                    )
-                    if switched:
-                        encrypted_values[left_operand] = (c0_left, c1_left)
-                
-                elif right_modulus == self.coef_modulus and left_modulus != self.coef_modulus:
-                    # Right is large, left is small - bring right to small
-                    c0_right, c1_right, switched = apply_modulus_switching(
-                        right_operand, c0_right, c1_right, self.sk, self.small_modulus, 
-                        self.coef_modulus, self.plaintext_modulus, log_func
-                    )
-                    if switched:
-                        encrypted_values[right_operand] = (c0_right, c1_right)
+            # Noise bounds of the operands at their final levels, None if not tracked
+            left_estimate = left.noise_estimate
+            right_estimate = right.noise_estimate
+            result_estimate = None
             
             # Perform the actual operation
             if operation == "+":
-                c0_result, c1_result = add(c0_left, c1_left, c0_right, c1_right)
+                result = add_ciphertexts(left, right)
+                if left_estimate is not None and right_estimate is not None:
+                    result_estimate = self.noise_estimator.add(left_estimate, right_estimate)
                 op_symbol = "➕"
             elif operation == "*":
-                c0_mult, c1_mult, c2_mult = mul(c0_left, c1_left, c0_right, c1_right)
+                result = mul(*left, *right)
+                if left_estimate is not None and right_estimate is not None:
+                    result_estimate = self.noise_estimator.multiply(left_estimate, right_estimate)
                 
-                # Determine which relinearization keys to use
-                current_modulus = c0_mult.coef_modulus
-                
-                if current_modulus == self.coef_modulus:
-                    # Large modulus - use original keys
-                    self.generate_relinearization_keys()
-                    c0_result, c1_result = relinearize(c0_mult, c1_mult, c2_mult, self.eks,
-                                                       self.base, self.coef_modulus, self.poly_modulus)
+                if self.lazy_relinearization:
+                    if log:
+                        log("   • Релинеаризацията е отложена (резултат с 3 компонента)")
                 else:
-                    # Small modulus - generate temporary keys
                     try:
-                        small_sk = self.sk.copy()
-                        small_sk.coef_modulus = current_modulus
-                        
-                        small_eks = gen_relinearization_key(small_sk, self.base, current_modulus, 
-                                                          self.poly_modulus, self.plaintext_modulus)
-                        
-                        c0_result, c1_result = relinearize(c0_mult, c1_mult, c2_mult, small_eks,
-                                                           self.base, current_modulus, self.poly_modulus)
-                        
+                        result = self.relinearize_ciphertext(result)
+                        if result_estimate is not None:
+                            result_estimate = self.noise_estimator.relinearize(result_estimate,
+                                                                               result[0].coef_modulus)
                     except Exception as relin_error:
                         if log:
                             log(f"   ❌ Грешка при relinearization: {str(relin_error)}")
-                        
-                        # Fallback: Use result without relinearization
-                        c0_result, c1_result = c0_mult, c1_mult
+                        # Fallback: keep the 3-component result, it still decrypts
                 
                 op_symbol = "✖️"
             else:
                 raise ValueError(f"Неподдържана операция: {operation}")
             
+            result = Ciphertext(result, result_estimate)
+            
             # Check result noise level with dynamic thresholds
             try:
-                result_noise_info = check_noise_level(c0_result, c1_result, self.sk, self.plaintext_modulus)
-                max_result_length = result_noise_info['max_length']
+                result_noise_info = self.noise_info(result)
+                max_result_bits = result_noise_info['max_bits']
+                result_noise_bits = result_noise_info['noise_bits']
                 
                 # Calculate the dynamic thresholds for the result
-                _, warning_result_threshold, critical_result_threshold = self.calculate_dynamic_thresholds(max_result_length)
+                _, warning_result_threshold, critical_result_threshold = self.calculate_dynamic_thresholds(max_result_bits)
                 
-                # Block if result has critical noise length
-                if result_noise_info['noise_length'] > critical_result_threshold:
+                # Block if result has critical noise
+                if result_noise_bits > critical_result_threshold:
                     if log:
                         log("")
                         log("🚫 ОПЕРАЦИЯТА Е БЛОКИРАНА СЛЕД ИЗПЪЛНЕНИЕ!")
-                        log(f"   Шумът в резултата е прекалено голям: {result_noise_info['noise_length']} числа")
-                        log(f"   Критичен праг: {critical_result_threshold} числа (85% от {max_result_length})")
+                        log(f"   Шумът в резултата е прекалено голям: {result_noise_bits} бита")
+                        log(f"   Критичен праг: {critical_result_threshold} бита ({self.critical_ratio:.0%} от {max_result_bits})")
                         log("   Резултатът няма да бъде запазен!")
                     
-                    return None, None, False, {
+                    return None, False, {
                         'blocked_reason': 'critical_result_noise',
-                        'result_noise_length': result_noise_info['noise_length'],
+                        'result_noise_bits': result_noise_bits,
                         'critical_threshold': critical_result_threshold,
                         'op_symbol': op_symbol
                     }
                 
-                # Warn if result has long noise but not critical
-                if result_noise_info['noise_length'] > warning_result_threshold:
+                # Warn if result has high noise but not critical
+                if result_noise_bits > warning_result_threshold:
                     if log:
                         log("⚠️ ВНИМАНИЕ: Резултатът има висок шум!")
-                        log(f"   Дължина на шума в резултат: {result_noise_info['noise_length']} числа")
-                        log(f"   Праг за предупреждение: {warning_result_threshold} числа (75% от {max_result_length})")
-                        if result_noise_info['noise_length'] > (critical_result_threshold - 2):
+                        log(f"   Шум в резултата: {result_noise_bits} бита (остават {result_noise_info['budget_bits']})")
+                        log(f"   Праг за предупреждение: {warning_result_threshold} бита ({self.warning_ratio:.0%} от {max_result_bits})")
+                        if result_noise_bits > (critical_result_threshold - self.threshold_gap_bits // 2):
                             log("   🚨 ВНИМАНИЕ: Много близо до критичния праг!")
                 
             except Exception as noise_check_error:
                 if log:
                     log("⚠️ ВНИМАНИЕ: Не можах да проверя шума в резултата!")
             
-            return c0_result, c1_result, True, {
+            return result, True, {
                 'op_symbol': op_symbol,
                 'success': True
             }
@@ -276,12 +617,12 @@ class OperationHandler:
             if log:
                 log(f"❌ Грешка при операция: {str(e)}")
             
-            return None, None, False, {
+            return None, False, {
                 'error': str(e),
                 'op_symbol': operation
             }
     
-    def check_and_apply_auto_switching(self, cryptogram_name, c0, c1, encrypted_values, log_func=None):
+    def check_and_apply_auto_switching(self, cryptogram_name, ciphertext, encrypted_values, log_func=None):
         # Check noise and automatically apply modulus switching
         
         def log(message):
@@ -289,28 +630,30 @@ class OperationHandler:
                 log_func(message)
         
         try:
-            noise_info = check_noise_level(c0, c1, self.sk, self.plaintext_modulus)
+            noise_info = self.noise_info(ciphertext)
             
-            switching_threshold, _, _ = self.calculate_dynamic_thresholds(noise_info['max_length'])
+            switching_threshold, _, _ = self.calculate_dynamic_thresholds(noise_info['max_bits'])
             
             # Check if switching should be applied
-            if noise_info['noise_length'] > switching_threshold:
+            if noise_info['noise_bits'] > switching_threshold:
                 if log:
-                    log(f"⚠️ Преди операция: Шумът в {cryptogram_name} е {noise_info['noise_length']} числа")
-                    log(f"   Switching праг: {switching_threshold} (63% от {noise_info['max_length']})")
+                    log(f"⚠️ Преди операция: Шумът в {cryptogram_name} е {noise_info['noise_bits']} бита")
+                    log(f"   Switching праг: {switching_threshold} бита ({self.switching_ratio:.0%} от {noise_info['max_bits']})")
                     log(f"   Прилагане на автоматично modulus switching...")
                 
-                # Apply switching
-                new_c0, new_c1, switching_applied = apply_modulus_switching(
-                    cryptogram_name, c0, c1, self.sk, self.small_modulus, 
-                    self.coef_modulus, self.plaintext_modulus, log_func
-                )
+                # A measured noise still holds after switching unless relinearization
+                # added its own; a tracked bound is updated by the relinearization itself
+                noise_bound = None
+                if not noise_info.get('estimated') and len(ciphertext) == 2:
+                    noise_bound = noise_info['noise']
+                
+                # Apply switching (updates the stored cryptogram)
+                switching_applied = self.switch_stored(cryptogram_name, encrypted_values, log_func,
+                                                       noise_bound=noise_bound)
                 
                 if switching_applied:
                     if log:
                         log(f"✅ Modulus switching успешен за {cryptogram_name}!")
-                    # Update stored cryptogram
-                    encrypted_values[cryptogram_name] = (new_c0, new_c1)
                     return True
                 else:
                     if log:
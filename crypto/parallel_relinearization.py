@@ -0,0 +1,166 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from core.polynomial import QuotientRingPoly
+from core.relinearization import (accumulate_key_products, decomposition_values,
+                                  iter_digit_range, key_coefficients,
+                                  relinearization_digits)
+
+
+def encode_keys(eks, coef_modulus, buffer):
+    # Write the key coefficients mod q as fixed-width little-endian integers,
+    # laid out as [digit][ek0, ek1][coefficient]
+    width = (coef_modulus.bit_length() + 7) // 8
+    offset = 0
+    for ek0, ek1 in eks:
+        for coef in (ek0.coef, ek1.coef):
+            for value in coef:
+                buffer[offset:offset + width] = (int(value) % coef_modulus).to_bytes(width, 'little')
+                offset += width
+    return width
+
+
+def decode_keys(buffer, n_terms, degree, width):
+    # Inverse of encode_keys: list of (ek0, ek1) coefficient arrays
+    data = bytes(buffer[:n_terms * 2 * degree * width])
+    keys = []
+    offset = 0
+    for _ in range(n_terms):
+        pair = []
+        for _ in range(2):
+            coef = np.empty(degree, dtype=object)
+            for j in range(degree):
+                coef[j] = int.from_bytes(data[offset:offset + width], 'little')
+                offset += width
+            pair.append(coef)
+        keys.append(tuple(pair))
+    return keys
+
+
+# Keys decoded in a worker process, by shared memory block name
+_worker_keys = {}
+
+
+def _shared_chunk_products(layout, values, base, balanced, start, stop):
+    # Process-pool task: partial key products of digits start..stop-1, keys read
+    # from shared memory once per worker instead of being pickled with every task
+    name, n_terms, degree, width = layout
+    if name not in _worker_keys:
+        block = shared_memory.SharedMemory(name=name)
+        try:
+            # Keys of older key sets are no longer used once a new block shows up
+            if len(_worker_keys) >= 8:
+                _worker_keys.clear()
+            _worker_keys[name] = decode_keys(block.buf, n_terms, degree, width)
+        finally:
+            block.close()
+    keys = _worker_keys[name][start:stop]
+    return accumulate_key_products(iter_digit_range(values, base, balanced, start, stop), keys)
+
+
+def _chunk_products(key_coefs, values, base, balanced, start, stop):
+    # Thread-pool task: same as above with the keys of this process
+    return accumulate_key_products(iter_digit_range(values, base, balanced, start, stop), key_coefs)
+
+
+class ParallelRelinearizer:
+    # Relinearization with the digits of c2 split into contiguous chunks, one per
+    # worker. Each worker returns unreduced partial sums; they are added and reduced once.
+    # executor='process' shares the keys through shared memory, 'thread' uses them directly.
+
+    def __init__(self, max_workers=None, executor='process', min_digits=8):
+        if executor not in ('process', 'thread'):
+            raise ValueError(f"Неизвестен тип на пула: {executor}")
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.executor = executor
+        # Fewer digits than this are relinearized sequentially
+        self.min_digits = min_digits
+
+        self._pool = None
+        self._lock = threading.Lock()
+        # coef_modulus -> (eks, SharedMemory, layout)
+        self._shared_keys = {}
+
+    def _get_pool(self):
+        with self._lock:
+            if self._pool is None:
+                if self.executor == 'process':
+                    # Spawned workers: forking the Tk process would copy its threads' locks mid-use
+                    self._pool = ProcessPoolExecutor(max_workers=self.max_workers,
+                                                     mp_context=multiprocessing.get_context("spawn"))
+                else:
+                    self._pool = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                    thread_name_prefix="relinearization")
+            return self._pool
+
+    def _share_keys(self, eks, coef_modulus):
+        # Shared memory layout of the keys of one level, created once per key set
+        with self._lock:
+            entry = self._shared_keys.get(coef_modulus)
+            if entry is not None and entry[0] is eks:
+                return entry[2]
+            if entry is not None:
+                self._release(entry)
+
+            degree = len(eks[0][0].coef)
+            width = (coef_modulus.bit_length() + 7) // 8
+            block = shared_memory.SharedMemory(create=True, size=len(eks) * 2 * degree * width)
+            encode_keys(eks, coef_modulus, block.buf)
+            layout = (block.name, len(eks), degree, width)
+            self._shared_keys[coef_modulus] = (eks, block, layout)
+            return layout
+
+    def chunks(self, n_terms):
+        # Contiguous digit ranges, one per worker
+        n_chunks = max(1, min(self.max_workers, n_terms))
+        bounds = [round(i * n_terms / n_chunks) for i in range(n_chunks + 1)]
+        return list(zip(bounds, bounds[1:]))
+
+    def relinearize(self, c0, c1, c2, eks, base, coef_modulus, poly_modulus, balanced=False):
+        # Same result as core.relinearization.relinearize
+        assert relinearization_digits(coef_modulus, base, balanced) == len(eks)
+        values = decomposition_values(c2, base, balanced)
+        pool = self._get_pool()
+
+        if self.executor == 'process':
+            layout = self._share_keys(eks, coef_modulus)
+            tasks = [pool.submit(_shared_chunk_products, layout, values, base, balanced, start, stop)
+                     for start, stop in self.chunks(len(eks))]
+        else:
+            tasks = [pool.submit(_chunk_products, list(key_coefficients(eks[start:stop])),
+                                 values, base, balanced, start, stop)
+                     for start, stop in self.chunks(len(eks))]
+
+        acc0, acc1 = tasks[0].result()
+        for task in tasks[1:]:
+            part0, part1 = task.result()
+            acc0 += part0
+            acc1 += part1
+
+        c0_hat = c0 + QuotientRingPoly(acc0, coef_modulus, poly_modulus)
+        c1_hat = c1 + QuotientRingPoly(acc1, coef_modulus, poly_modulus)
+        return c0_hat, c1_hat
+
+    def _release(self, entry):
+        _, block, _ = entry
+        block.close()
+        block.unlink()
+
+    def release_keys(self):
+        # Drop the shared copies of the keys, e.g. after key regeneration
+        with self._lock:
+            for entry in self._shared_keys.values():
+                self._release(entry)
+            self._shared_keys = {}
+
+    def close(self):
+        self.release_keys()
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
@@ -0,0 +1,95 @@
+import json
+import os
+import tempfile
+from dataclasses import asdict, dataclass, field
+
+from crypto.modulus_compatibility import verify_modulus_compatibility
+
+# Bump whenever the stored layout or the way moduli are generated changes
+CACHE_VERSION = 4
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".bgvision", "parameter_cache")
+
+
+@dataclass
+class ParameterContext:
+    # Public parameters for one (n, λ, t, levels) configuration; the relinearization base
+    # does not affect the moduli and is chosen with the keys
+    n: int
+    lambda_security: int
+    plaintext_modulus: int
+    coef_modulus: int
+    small_modulus: int
+    delta: int
+    levels: int = 2
+    moduli: list = field(default_factory=list)
+    prime_chain: dict = None
+
+    def key(self):
+        return self.n, self.lambda_security, self.plaintext_modulus, self.levels
+
+
+def create_parameter_context(n, lambda_security, plaintext_modulus, moduli, prime_chain=None):
+    # Context for a modulus chain (top level first); two levels = (coef_modulus, small_modulus)
+    coef_modulus, small_modulus = moduli[0], moduli[-1]
+    return ParameterContext(n, lambda_security, plaintext_modulus,
+                            coef_modulus, small_modulus, coef_modulus // small_modulus,
+                            len(moduli), list(moduli), prime_chain)
+
+
+def get_cache_dir(cache_dir=None):
+    # Versioned cache directory; BGVISION_CACHE_DIR overrides the default location
+    root = cache_dir or os.environ.get("BGVISION_CACHE_DIR") or DEFAULT_CACHE_DIR
+    return os.path.join(root, f"v{CACHE_VERSION}")
+
+
+def cache_path(n, lambda_security, plaintext_modulus, levels=2, cache_dir=None):
+    filename = f"n{n}_l{lambda_security}_t{plaintext_modulus}_L{levels}.json"
+    return os.path.join(get_cache_dir(cache_dir), filename)
+
+
+def load_parameter_context(n, lambda_security, plaintext_modulus, levels=2, cache_dir=None):
+    # Returns the cached context, or None on a miss or if the entry fails verification
+    path = cache_path(n, lambda_security, plaintext_modulus, levels, cache_dir)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.pop('version', None) != CACHE_VERSION:
+            return None
+        context = ParameterContext(**data)
+    except (OSError, ValueError, TypeError):
+        return None
+
+    if context.key() != (n, lambda_security, plaintext_modulus, levels):
+        return None
+    if context.coef_modulus != context.small_modulus * context.delta:
+        return None
+    if len(context.moduli) != levels or context.moduli[0] != context.coef_modulus \
+            or context.moduli[-1] != context.small_modulus:
+        return None
+    if any(upper % lower for upper, lower in zip(context.moduli, context.moduli[1:])):
+        return None
+    if verify_modulus_compatibility(context.coef_modulus, context.small_modulus,
+                                    context.plaintext_modulus, context.prime_chain,
+                                    context.n if context.prime_chain else None):
+        return None
+    return context
+
+
+def store_parameter_context(context, cache_dir=None):
+    # Atomically write the context; failures only cost a cache miss next time
+    path = cache_path(*context.key(), cache_dir=cache_dir)
+    data = dict(asdict(context), version=CACHE_VERSION)
+    tmp_path = None
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+        return True
+    except OSError as e:
+        if tmp_path and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        print(f"⚠️  Неуспешен запис в кеша на параметрите: {e}")
+        return False
@@ -0,0 +1,82 @@
+from crypto.noise_metrics import noise_bits
+
+
+class SwitchingScheduler:
+    # Places modulus switches by their effect on the noise budget instead of the ratio rule.
+    # Both operands of a multiplication are switched together, to the level that leaves the
+    # relinearized product the most budget bits; a deeper level is chosen only if it gains at
+    # least min_gain_bits, so levels are not spent while the noise is still near its floor.
+    # The ratio rule stays as fallback: an operand above switching_threshold(max_bits) moves
+    # the pair one level further, and the pair keeps moving down while the product would end
+    # less than margin_bits below the critical threshold. Operands of additions and fresh
+    # results are not switched here, OperationHandler applies the ratio rule to them. Works on
+    # noise bounds only, so the circuit planner simulates the same decisions.
+
+    def __init__(self, moduli, estimator, switching_threshold, critical_ratio=0.85, min_gain_bits=10,
+                 margin_bits=10):
+        self.moduli = list(moduli)
+        self.estimator = estimator
+        self.switching_threshold = switching_threshold
+        self.critical_ratio = critical_ratio
+        self.min_gain_bits = min_gain_bits
+        self.margin_bits = margin_bits
+
+    def max_bits(self, level):
+        return (self.moduli[level] // 2).bit_length()
+
+    def switched_noise(self, noise, level, target):
+        # Noise after switching from level down to target one level at a time, None if
+        # apply_modulus_switching would refuse a step (noise above the critical ratio)
+        for current in range(level, target):
+            if noise_bits(noise) > int(self.max_bits(current) * self.critical_ratio):
+                return None
+            noise = self.estimator.switch(noise, self.moduli[current] // self.moduli[current + 1])
+        return noise
+
+    def product_noise(self, left_noise, right_noise, level):
+        # Noise of the product after multiplying and relinearizing at level
+        product = self.estimator.multiply(left_noise, right_noise)
+        return self.estimator.relinearize(product, self.moduli[level])
+
+    def product_budget(self, left_noise, right_noise, level):
+        # Budget bits left after multiplying and relinearizing at level
+        return self.max_bits(level) - noise_bits(self.product_noise(left_noise, right_noise, level))
+
+    def within_margin(self, left_noise, right_noise, level):
+        # True if the product at level stays margin_bits below the critical threshold
+        limit = int(self.max_bits(level) * self.critical_ratio) - self.margin_bits
+        return noise_bits(self.product_noise(left_noise, right_noise, level)) <= limit
+
+    def multiplication_level(self, left_noise, left_level, right_noise, right_level):
+        # Common level for the (relinearized) operands of a product
+        best_level = max(left_level, right_level)
+        left_start = self.switched_noise(left_noise, left_level, best_level)
+        right_start = self.switched_noise(right_noise, right_level, best_level)
+        if left_start is None or right_start is None:
+            # No checked switch to the common level; perform_operation aligns unconditionally
+            return best_level
+        best_budget = self.product_budget(left_start, right_start, best_level)
+
+        for level in range(best_level + 1, len(self.moduli)):
+            left_switched = self.switched_noise(left_noise, left_level, level)
+            right_switched = self.switched_noise(right_noise, right_level, level)
+            if left_switched is None or right_switched is None:
+                break
+            budget = self.product_budget(left_switched, right_switched, level)
+            if budget >= best_budget + self.min_gain_bits:
+                best_level, best_budget = level, budget
+                left_start, right_start = left_switched, right_switched
+
+        # Fallback: noise still above the ratio threshold at the chosen level
+        threshold = self.switching_threshold(self.max_bits(best_level))
+        force_switch = max(noise_bits(left_start), noise_bits(right_start)) > threshold
+        while best_level + 1 < len(self.moduli):
+            if not force_switch and self.within_margin(left_start, right_start, best_level):
+                break
+            left_next = self.switched_noise(left_start, best_level, best_level + 1)
+            right_next = self.switched_noise(right_start, best_level, best_level + 1)
+            if left_next is None or right_next is None:
+                break
+            best_level, left_start, right_start = best_level + 1, left_next, right_next
+            force_switch = False
+        return best_level
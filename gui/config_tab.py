@@ -1,10 +1,16 @@
+import time
+
 from config.config import config
-from config.parameter_validator import validate_bgv_parameters
+from config.parameter_validator import is_auto_base, validate_bgv_parameters
 from core.bgv import gen_public_key, gen_secret_key
 from core.polynomial import init_poly_modulus
-from crypto.modulus_compatibility import (generate_compatible_modulus,
+from crypto.modulus_compatibility import (generate_compatible_modulus_async,
+                                          generate_modulus_chain_async,
                                           verify_modulus_compatibility)
 from crypto.operation_handler import OperationHandler
+from crypto.parameter_cache import (create_parameter_context,
+                                    load_parameter_context,
+                                    store_parameter_context)
 from gui.styles import Icons
 from gui.widget_factory import (DialogFactory, LayoutHelper, WidgetFactory,
                                 create_parameter_row)
@@ -23,9 +29,14 @@ class ConfigurationTab:
         self.lambda_var = None
         self.plaintext_entry = None
         self.base_entry = None
+        self.levels_entry = None
         self.coef_display_label = None
         self.key_status_update = None
         
+        # Running modulus search (Future) and when it is given up
+        self.modulus_search = None
+        self.search_deadline = None
+        
         self.setup_configuration_tab()
 
     def setup_configuration_tab(self):
@@ -117,16 +128,23 @@ class ConfigurationTab:
         )
         self.base_entry.insert(0, str(config.bgv.BASE))
 
+        # Modulus chain levels
+        self.levels_entry, _ = create_parameter_row(
+            grid_frame, config.ui_texts.PARAM_LEVELS, "medium",
+            lambda: self.show_help('levels'), row=4
+        )
+        self.levels_entry.insert(0, str(config.bgv.MODULUS_LEVELS))
+
         # Coefficient modulus display
         coef_label = WidgetFactory.create_label(
             grid_frame, config.ui_texts.PARAM_Q, "subheading"
         )
-        LayoutHelper.grid_configure(coef_label, row=4, column=0, sticky='w')
+        LayoutHelper.grid_configure(coef_label, row=5, column=0, sticky='w')
 
         self.coef_display_label = WidgetFactory.create_label(
             grid_frame, config.ui_texts.PARAM_Q_AUTO, "accent"
         )
-        LayoutHelper.grid_configure(self.coef_display_label, row=4, column=1, sticky='w')
+        LayoutHelper.grid_configure(self.coef_display_label, row=5, column=1, sticky='w')
 
     def setup_generate_section(self, parent):
         # Setup generate button section
@@ -217,6 +235,9 @@ class ConfigurationTab:
             self.base_entry.delete(0, 'end')
             self.base_entry.insert(0, str(config.bgv.BASE))
 
+            self.levels_entry.delete(0, 'end')
+            self.levels_entry.insert(0, str(config.bgv.MODULUS_LEVELS))
+
             # Reset coefficient modulus display
             self.coef_display_label.config(text=config.ui_texts.PARAM_Q_AUTO)
 
@@ -233,7 +254,8 @@ class ConfigurationTab:
                 f"• Степен на полинома (n): {config.bgv.N}\n"
                 f"• Параметър за сигурност (λ): {config.bgv.LAMBDA_SECURITY}\n"
                 f"• Модул на открития текст (t): {config.bgv.PLAINTEXT_MODULUS}\n"
-                f"• База за релинеаризация: {config.bgv.BASE}\n\n"
+                f"• База за релинеаризация: {config.bgv.BASE}\n"
+                f"• Нива на модула: {config.bgv.MODULUS_LEVELS}\n\n"
                 f"Моля, генерирайте нови ключове, за да приложите промените.")
 
         except Exception as e:
@@ -255,6 +277,7 @@ class ConfigurationTab:
         log_to_results(results_text, f"   λ = {config.bgv.LAMBDA_SECURITY}.")
         log_to_results(results_text, f"   t = {config.bgv.PLAINTEXT_MODULUS}.")
         log_to_results(results_text, f"   База на релинеаризация = {config.bgv.BASE}.")
+        log_to_results(results_text, f"   Нива на модула = {config.bgv.MODULUS_LEVELS}.")
         log_to_results(results_text, "   Моля, генерирайте нови ключове!")
         log_to_results(results_text, "")
 
@@ -265,7 +288,8 @@ class ConfigurationTab:
             'n': config.help.HELP_N,
             'lambda': config.help.HELP_LAMBDA,
             't': config.help.HELP_T,
-            'base': config.help.HELP_BASE
+            'base': config.help.HELP_BASE,
+            'levels': config.help.HELP_LEVELS
         }
         
         help_text = help_texts.get(parameter_name, "Няма помощна информация.")
@@ -274,12 +298,18 @@ class ConfigurationTab:
     def generate_keys_with_integrated_logic(self):
         # Generate keys
         
+        # The running search uses the current parameters
+        if self.modulus_search is not None:
+            DialogFactory.show_warning("Търсенето на модул вече е в ход.")
+            return
+        
         try:
             # Get parameters
             self.main_app.n = int(self.n_entry.get())
             self.main_app.lambda_security = int(self.lambda_var.get())
             self.main_app.plaintext_modulus = int(self.plaintext_entry.get())
-            self.main_app.base = int(self.base_entry.get())
+            base_text = self.base_entry.get().strip()
+            self.main_app.modulus_levels = int(self.levels_entry.get())
 
             # Calculate coefficient modulus
             coef_bits = config.get_suggested_coef_bits(
@@ -294,7 +324,8 @@ class ConfigurationTab:
             # Validate parameters
             errors = validate_bgv_parameters(
                 self.main_app.n, self.main_app.lambda_security,
-                self.main_app.plaintext_modulus, self.main_app.base
+                self.main_app.plaintext_modulus, base_text,
+                self.main_app.modulus_levels
             )
             
             if errors:
@@ -304,16 +335,32 @@ class ConfigurationTab:
                 self.key_status_update('error', config.ui_texts.STATUS_INVALID_PARAMS)
                 return
 
-            # Generate compatible moduls
-            (self.main_app.coef_modulus, 
-             self.main_app.small_modulus, 
-             self.main_app.delta) = generate_compatible_modulus(
-                self.main_app.lambda_security, self.main_app.plaintext_modulus
-            )
+            # "auto" = base chosen by the cost model once the modulus chain is known
+            self.main_app.base = 'auto' if is_auto_base(base_text) else int(base_text)
+
+            # Reuse vetted moduli for this configuration if they are cached
+            parameter_context = self.load_cached_parameters()
+            if parameter_context is not None:
+                self.finish_key_generation(parameter_context)
+            else:
+                self.start_modulus_search()
+
+        except Exception as e:
+            self.key_status_update('error', config.ui_texts.STATUS_GENERATION_ERROR)
+            DialogFactory.show_error("Грешка", "Грешка при генериране на ключове", str(e))
+
+    def finish_key_generation(self, parameter_context):
+        # Keys and operation handler for the chosen moduli
+        try:
+            self.main_app.parameter_context = parameter_context
+            self.main_app.coef_modulus = parameter_context.coef_modulus
+            self.main_app.small_modulus = parameter_context.small_modulus
+            self.main_app.delta = parameter_context.delta
 
             # Check compatibility
             compatibility_errors = verify_modulus_compatibility(
-                self.main_app.coef_modulus, self.main_app.small_modulus, self.main_app.plaintext_modulus
+                self.main_app.coef_modulus, self.main_app.small_modulus, self.main_app.plaintext_modulus,
+                parameter_context.prime_chain, self.main_app.n if parameter_context.prime_chain else None
             )
             if compatibility_errors:
                 error_msg = "\n".join(f"• {error}" for error in compatibility_errors)
@@ -332,11 +379,39 @@ class ConfigurationTab:
                 self.main_app.poly_modulus, self.main_app.plaintext_modulus
             )
 
+            # Key material of the previous keys must not be reused
+            if self.main_app.operation_handler is not None:
+                self.main_app.operation_handler.shutdown()
+
             # Create operation handler
             self.main_app.operation_handler = OperationHandler(
                 self.main_app.sk, self.main_app.coef_modulus, self.main_app.small_modulus,
-                self.main_app.poly_modulus, self.main_app.plaintext_modulus, self.main_app.base
+                self.main_app.poly_modulus, self.main_app.plaintext_modulus, self.main_app.base,
+                moduli=parameter_context.moduli,
+                lazy_relinearization=config.noise.LAZY_RELINEARIZATION,
+                key_switching=config.bgv.KEY_SWITCHING,
+                hybrid_digits=config.bgv.HYBRID_DIGITS,
+                balanced_digits=config.bgv.BALANCED_DIGITS,
+                relinearization_workers=config.relinearization.PARALLEL_WORKERS,
+                relinearization_executor=config.relinearization.PARALLEL_EXECUTOR,
+                relinearization_min_digits=config.relinearization.PARALLEL_MIN_DIGITS,
+                verify_switching=config.noise.VERIFY_SWITCHING,
+                noise_estimation=config.noise.NOISE_ESTIMATION,
+                switching_ratio=config.noise.SWITCHING_RATIO,
+                warning_ratio=config.noise.WARNING_RATIO,
+                critical_ratio=config.noise.CRITICAL_RATIO,
+                threshold_gap_bits=config.noise.THRESHOLD_GAP_BITS,
+                noise_samples=config.noise.NOISE_SAMPLES,
+                noise_failure_probability=config.noise.NOISE_SAMPLING_FAILURE,
+                switching_policy=config.noise.SWITCHING_POLICY,
+                switching_min_gain_bits=config.noise.SWITCHING_MIN_GAIN_BITS,
+                switching_margin_bits=config.noise.SWITCHING_MARGIN_BITS,
+                planning_margin_bits=config.noise.PLANNING_MARGIN_BITS,
+                public_key=(self.main_app.pk0, self.main_app.pk1)
             )
+            self.main_app.base = self.main_app.operation_handler.base
+            if config.generation.PRECOMPUTE_KEY_MATERIAL:
+                self.main_app.operation_handler.warm_up_key_material()
 
             # Update status
             self.key_status_update('success', config.ui_texts.STATUS_KEYS_SUCCESS)
@@ -359,6 +434,75 @@ class ConfigurationTab:
             self.key_status_update('error', config.ui_texts.STATUS_GENERATION_ERROR)
             DialogFactory.show_error("Грешка", "Грешка при генериране на ключове", str(e))
 
+    def load_cached_parameters(self):
+        # Cached parameter context for the current configuration, or None
+        if not config.generation.USE_PARAMETER_CACHE:
+            return None
+        return load_parameter_context(
+            self.main_app.n, self.main_app.lambda_security,
+            self.main_app.plaintext_modulus, self.main_app.modulus_levels,
+            config.generation.PARAMETER_CACHE_DIR or None
+        )
+
+    def start_modulus_search(self):
+        # Search for new moduli in the background (over SEARCH_WORKERS processes) and poll
+        # it from the Tk event loop, so the window stays responsive
+        max_workers = config.get_search_workers()
+
+        if self.main_app.modulus_levels > 2:
+            modulus_search = generate_modulus_chain_async(
+                self.main_app.lambda_security, self.main_app.plaintext_modulus,
+                self.main_app.n, self.main_app.modulus_levels, max_workers=max_workers
+            )
+        else:
+            modulus_search = generate_compatible_modulus_async(
+                self.main_app.lambda_security, self.main_app.plaintext_modulus,
+                max_workers=max_workers
+            )
+
+        self.modulus_search = modulus_search
+        self.search_deadline = time.monotonic() + config.generation.SEARCH_TIMEOUT
+        self.key_status_update('normal', config.ui_texts.STATUS_SEARCHING)
+        self.poll_modulus_search()
+
+    def poll_modulus_search(self):
+        # Check the running search; reschedules itself until it is done or timed out
+        modulus_search = self.modulus_search
+        if not modulus_search.done():
+            if time.monotonic() < self.search_deadline:
+                self.main_app.root.after(config.generation.SEARCH_POLL_MS, self.poll_modulus_search)
+                return
+            modulus_search.cancel()
+            self.modulus_search = None
+            self.key_status_update('error', config.ui_texts.STATUS_GENERATION_ERROR)
+            DialogFactory.show_error("Грешка", "Търсенето на модул отне твърде дълго.",
+                                     f"Прекратено след {config.generation.SEARCH_TIMEOUT:.0f} секунди.")
+            return
+
+        self.modulus_search = None
+        try:
+            parameter_context = self.parameter_context_from_search(modulus_search.result())
+            if config.generation.USE_PARAMETER_CACHE:
+                store_parameter_context(parameter_context, config.generation.PARAMETER_CACHE_DIR or None)
+        except Exception as e:
+            self.key_status_update('error', config.ui_texts.STATUS_GENERATION_ERROR)
+            DialogFactory.show_error("Грешка", "Грешка при генериране на ключове", str(e))
+            return
+        self.finish_key_generation(parameter_context)
+
+    def parameter_context_from_search(self, search_result):
+        # ParameterContext for the result of the modulus search
+        if self.main_app.modulus_levels > 2:
+            moduli, prime_chain = search_result
+        else:
+            coef_modulus, small_modulus, _, _ = search_result
+            moduli, prime_chain = [coef_modulus, small_modulus], None
+
+        return create_parameter_context(
+            self.main_app.n, self.main_app.lambda_security,
+            self.main_app.plaintext_modulus, moduli, prime_chain
+        )
+
     def log_key_generation_success(self):
         # Log successful key generation with details
         
@@ -375,5 +519,12 @@ class ConfigurationTab:
         log_to_results(results_text, f"   Степен на полинома (n): {self.main_app.n}")
         log_to_results(results_text, f"   Модул на явното съобщение (t): {self.main_app.plaintext_modulus} → [0, {self.main_app.plaintext_modulus - 1}]")
         log_to_results(results_text, f"   Параметър за сигурност (δ): {self.main_app.delta}")
-        log_to_results(results_text, f"   База за релинеаризация: {self.main_app.base}")
+        base_note = " (избрана автоматично)" if is_auto_base(self.base_entry.get().strip()) else ""
+        log_to_results(results_text, f"   База за релинеаризация: {self.main_app.base}{base_note}")
+        operation_handler = self.main_app.operation_handler
+        if operation_handler.key_switching == 'hybrid':
+            log_to_results(results_text, f"   Хибридна релинеаризация: {operation_handler.hybrid_digits} цифри, "
+                                         f"P с {operation_handler.special_modulus.bit_length()} бита")
+        log_to_results(results_text, f"   Нива на модула: {self.main_app.modulus_levels} "
+                                     f"({', '.join(str(m.bit_length()) for m in self.main_app.parameter_context.moduli)} бита)")
         log_to_results(results_text, "")
\ No newline at end of file
@@ -3,8 +3,10 @@ import tkinter as tk
 
 import numpy as np
 
-from core.bgv import decrypt, encrypt
+from core.bgv import encrypt
+from core.ciphertext import Ciphertext
 from config.config import config
+from crypto.noise_management import check_ciphertext_noise, decrypt_cached, noise_distribution
 from crypto.operation_handler import calculate_expected_result_for_name
 from config.parameter_validator import (validate_input_values,
                                  validate_operation_inputs)
@@ -122,6 +124,15 @@ class OperationsTab:
         )
         LayoutHelper.pack_configure(self.crypto_instruction_label, anchor='w', pady=(0, 15))
 
+        # Planned multiplicative depth, picks the encryption level
+        depth_label = WidgetFactory.create_label(
+            parent, config.ui_texts.PLANNED_DEPTH, "subheading"
+        )
+        LayoutHelper.pack_configure(depth_label, anchor='w', pady=(0, 5))
+
+        self.planned_depth_entry = WidgetFactory.create_entry(parent, "small")
+        LayoutHelper.pack_configure(self.planned_depth_entry, anchor='w', pady=(0, 15))
+
     def setup_encryption_buttons(self, parent):
         # Setup encryption action buttons
         
@@ -389,19 +400,34 @@ class OperationsTab:
                                        "Намерени са следните грешки:", error_msg)
                 return
 
-            # Create polynomial and encrypt
-            poly = QuotientRingPoly(parsed_values, self.main_app.coef_modulus, 
-                                   self.main_app.poly_modulus)
-            c0, c1 = encrypt(poly, self.main_app.pk0, self.main_app.pk1, 
-                           self.main_app.coef_modulus, self.main_app.poly_modulus, 
-                           self.main_app.plaintext_modulus)
+            depth, depth_error = self.parse_planned_depth()
+            if depth_error:
+                DialogFactory.show_error(Messages.INVALID_INPUT, depth_error)
+                return
 
-            # Store cryptogram and original values
-            self.main_app.encrypted_values[name] = (c0, c1)
+            # Encrypt and store cryptogram and original values
+            handler = self.main_app.operation_handler
+            level = 0
+            if handler is not None:
+                if depth is not None and config.noise.ENCRYPT_AT_PLANNED_LEVEL:
+                    level = handler.level_for_depth(depth)
+                self.main_app.encrypted_values[name] = handler.encrypt_at_level(parsed_values, level)
+            else:
+                poly = QuotientRingPoly(parsed_values, self.main_app.coef_modulus,
+                                       self.main_app.poly_modulus)
+                c0, c1 = encrypt(poly, self.main_app.pk0, self.main_app.pk1,
+                               self.main_app.coef_modulus, self.main_app.poly_modulus,
+                               self.main_app.plaintext_modulus)
+                self.main_app.encrypted_values[name] = Ciphertext((c0, c1))
             self.main_app.original_values[name] = parsed_values.copy()
 
             from gui.ui_components import log_to_results
-            log_to_results(self.results_text, f"Криптограма „{name}“ създадена: {parsed_values}")
+            if level:
+                log_to_results(self.results_text,
+                               f"Криптограма „{name}“ създадена на ниво {level} "
+                               f"(дълбочина {depth}): {parsed_values}")
+            else:
+                log_to_results(self.results_text, f"Криптограма „{name}“ създадена: {parsed_values}")
 
             # Update counters and UI
             self.main_app.next_crypto_letter += 1
@@ -415,6 +441,20 @@ class OperationsTab:
         except Exception as e:
             DialogFactory.show_error("Грешка", "Грешка при криптиране", str(e))
 
+    def parse_planned_depth(self):
+        # Planned number of multiplications, None (top level) when the field is empty
+        entry = getattr(self, 'planned_depth_entry', None)
+        text = entry.get().strip() if entry is not None else ''
+        if not text:
+            return None, None
+        try:
+            depth = int(text)
+        except ValueError:
+            return None, f"Невалидна дълбочина: {text}"
+        if depth < 0:
+            return None, "Дълбочината не може да бъде отрицателна."
+        return depth, None
+
     def generate_random_values(self):
         # Generate random values
         if not hasattr(self.main_app, 'n') or not hasattr(self.main_app, 'plaintext_modulus'):
@@ -475,31 +515,29 @@ class OperationsTab:
                 for warning in warnings:
                     if warning['type'] == 'high_noise':
                         self.log_to_console(Messages.HIGH_NOISE)
-                        self.log_to_console(f"   Дължина на шума в {warning['operand']}: {warning['noise_length']} числа")
+                        self.log_to_console(f"   Шум в {warning['operand']}: {warning['noise_bits']} бита")
 
-            # Apply automatic modulus switching if needed
-            for operand in [left_operand, right_operand]:
-                c0, c1 = self.main_app.encrypted_values[operand]
-                self.main_app.operation_handler.check_and_apply_auto_switching(
-                    operand, c0, c1, self.main_app.encrypted_values,
-                    lambda msg: self.log_to_console(msg)
-                )
+            # Apply modulus switching where the scheduler (or the ratio fallback) places it
+            self.main_app.operation_handler.apply_scheduled_switching(
+                left_operand, operation, right_operand, self.main_app.encrypted_values,
+                lambda msg: self.log_to_console(msg)
+            )
 
             # Generate result name and perform operation
             result_name = f"R{self.main_app.result_counter}"
 
-            c0_result, c1_result, success, operation_info = self.main_app.operation_handler.perform_operation(
+            result, success, operation_info = self.main_app.operation_handler.perform_operation(
                 left_operand, operation, right_operand, self.main_app.encrypted_values,
                 lambda msg: self.log_to_console(msg)
             )
 
             if success:
                 # Store result
-                self.main_app.encrypted_values[result_name] = (c0_result, c1_result)
+                self.main_app.encrypted_values[result_name] = result
 
-                # Check and apply modulus switching on result
-                self.main_app.operation_handler.check_and_apply_auto_switching(
-                    result_name, c0_result, c1_result, self.main_app.encrypted_values,
+                # Modulus switching on the result (ratio rule only without the scheduler)
+                self.main_app.operation_handler.apply_result_switching(
+                    result_name, result, self.main_app.encrypted_values,
                     lambda msg: self.log_to_console(msg)
                 )
 
@@ -617,7 +655,8 @@ class OperationsTab:
         show_cryptogram_details(
             self.main_app.root, selected_name, self.main_app.encrypted_values, 
             self.main_app.original_values, self.main_app.sk, self.main_app.plaintext_modulus, 
-            self.main_app.operation_history, self.main_app.coef_modulus, self.main_app.poly_modulus
+            self.main_app.operation_history, self.main_app.coef_modulus, self.main_app.poly_modulus,
+            self.main_app.operation_handler.key_material
         )
 
     def decrypt_selected_from_list(self):
@@ -639,24 +678,20 @@ class OperationsTab:
                 DialogFactory.show_warning("Избраната стойност не съществува")
                 return
 
-            c0, c1 = self.main_app.encrypted_values[selected_name]
+            ciphertext = self.main_app.encrypted_values[selected_name]
+            c0 = ciphertext[0]
 
             # Use appropriate secret key for decryption
-            current_modulus = c0.coef_modulus
-            if current_modulus != self.main_app.coef_modulus:
-                decrypt_sk = self.main_app.sk.copy()
-                decrypt_sk.coef_modulus = current_modulus
-            else:
-                decrypt_sk = self.main_app.sk
+            operation_handler = self.main_app.operation_handler
+            decrypt_sk = operation_handler.get_level_sk(c0.coef_modulus)
 
-            # Decrypt
-            decrypted_poly, noise = decrypt(c0, c1, decrypt_sk, 
-                                          self.main_app.plaintext_modulus, return_noise=True)
+            # Decrypt (cached on the ciphertext, shared with the noise check below)
+            decrypted_poly, noise = decrypt_cached(ciphertext, decrypt_sk, self.main_app.plaintext_modulus)
             decrypted_values = decrypted_poly.coef.astype(int)
 
             # Check noise info
-            from crypto.noise_management import check_noise_level
-            noise_info = check_noise_level(c0, c1, self.main_app.sk, self.main_app.plaintext_modulus)
+            noise_info = check_ciphertext_noise(ciphertext, self.main_app.sk, self.main_app.plaintext_modulus,
+                                                operation_handler.key_material)
 
             # Calculate expected result
             expected_result = calculate_expected_result_for_name(
@@ -679,10 +714,17 @@ class OperationsTab:
             if expected_result is not None:
                 self.log_to_console(f"Очакван резултат:    {expected_result}")
                 
+            self.log_to_console(f"Ниво на модула: {self.main_app.operation_handler.get_level(c0)} "
+                                f"от {self.main_app.operation_handler.num_levels - 1}")
+            if len(ciphertext) > 2:
+                self.log_to_console(f"Компоненти: {len(ciphertext)} (нерелинеаризиран)")
             self.log_to_console(f"Ниво на шума: {noise}")
-            self.log_to_console(f"Дължина на шума: {noise_info['noise_length']} числа")
+            self.log_to_console(f"Шум: {noise_info['noise_bits']} бита от {noise_info['max_bits']}, "
+                                f"остават {noise_info['budget_bits']} бита")
             self.log_to_console(f"Макс позволен шум: {noise_info['max_noise']}")
-            self.log_to_console(f"Макс дължина: {noise_info['max_length']} числа")
+            distribution = noise_distribution(ciphertext, decrypt_sk)
+            self.log_to_console(f"Разпределение: медиана {distribution['median_bits']:.0f}, "
+                                f"RMS {distribution['rms_bits']:.1f}, макс {distribution['max_bits']} бита")
             self.log_to_console(f"Резултатът е {correctness_msg}!")
 
             # Show explanation if incorrect
@@ -3,8 +3,8 @@ from tkinter import ttk
 
 import numpy as np
 
-from core.bgv import decrypt
-from crypto.noise_management import check_noise_level
+from crypto.noise_management import check_ciphertext_noise, decrypt_cached
+from crypto.noise_metrics import noise_bits
 from crypto.operation_handler import calculate_expected_result_for_name
 
 
@@ -35,7 +35,7 @@ def bind_mousewheel(widget, canvas):
 
 def show_cryptogram_details(parent, cryptogram_name, encrypted_values, original_values, 
                            sk, plaintext_modulus, operation_history=None, coef_modulus=None,
-                           poly_modulus=None):
+                           poly_modulus=None, key_material=None):
     # Show detailed cryptogram information in a scrollable popup window
     details_window = tk.Toplevel(parent)
     details_window.title(f"Преглед на криптограма: {cryptogram_name}")
@@ -142,7 +142,7 @@ def show_cryptogram_details(parent, cryptogram_name, encrypted_values, original_
                                command=lambda: decrypt_and_show_in_details(
                                    cryptogram_name, encrypted_values, sk, plaintext_modulus,
                                    result_frame, operation_history, original_values,
-                                   coef_modulus, poly_modulus
+                                   coef_modulus, poly_modulus, key_material
                                ))
     decrypt_button.pack(pady=10)
     
@@ -252,8 +252,9 @@ def show_cryptogram_details(parent, cryptogram_name, encrypted_values, original_
 
 def decrypt_and_show_in_details(cryptogram_name, encrypted_values, sk, plaintext_modulus,
                                result_frame, operation_history=None, original_values=None,
-                               coef_modulus=None, poly_modulus=None):
-    # Decrypt and show results in the details window
+                               coef_modulus=None, poly_modulus=None, key_material=None):
+    # Decrypt and show results in the details window; the secret key of each level
+    # comes from the handler's KeyMaterialCache
     
     try:
         # Clear previous results
@@ -266,19 +267,14 @@ def decrypt_and_show_in_details(cryptogram_name, encrypted_values, sk, plaintext
             error_label.pack()
             return
         
-        c0, c1 = encrypted_values[cryptogram_name]
+        ciphertext = encrypted_values[cryptogram_name]
+        c0 = ciphertext[0]
         
-        # Check current modulus and use appropriate secret key
-        current_modulus = c0.coef_modulus
+        # Secret key of the current level
+        decrypt_sk = key_material.get_sk(c0.coef_modulus)
         
-        if current_modulus != sk.coef_modulus:
-            decrypt_sk = sk.copy()
-            decrypt_sk.coef_modulus = current_modulus
-        else:
-            decrypt_sk = sk
-        
-        # Decrypt
-        decrypted_poly, noise = decrypt(c0, c1, decrypt_sk, plaintext_modulus, return_noise=True)
+        # Decrypt (cached on the ciphertext, shared with the noise info below)
+        decrypted_poly, noise = decrypt_cached(ciphertext, decrypt_sk, plaintext_modulus)
         decrypted_values = decrypted_poly.coef.astype(int)
         
         # Show title
@@ -334,15 +330,14 @@ def decrypt_and_show_in_details(cryptogram_name, encrypted_values, sk, plaintext
         
         # Show noise info
         try:
-            noise_info = check_noise_level(c0, c1, sk, plaintext_modulus)
+            noise_info = check_ciphertext_noise(ciphertext, sk, plaintext_modulus, key_material)
             
-            noise_text = f"Ниво на шума: {noise} ({noise_info['noise_length']} цифри)"
+            noise_text = f"Ниво на шума: {noise} ({noise_info['noise_bits']} бита, остават {noise_info['budget_bits']})"
             noise_label = tk.Label(result_frame, text=noise_text,
                                   font=('Segoe UI', 9), fg='gray', bg='#f0f0f0')
             noise_label.pack(pady=(15, 0))
         except Exception as noise_error:
-            noise_digits = len(str(abs(int(noise))))
-            noise_text = f"Ниво на шума: {noise} ({noise_digits} цифри)"
+            noise_text = f"Ниво на шума: {noise} ({noise_bits(noise)} бита)"
             noise_label = tk.Label(result_frame, text=noise_text,
                                   font=('Segoe UI', 9), fg='gray', bg='#f0f0f0')
             noise_label.pack(pady=(15, 0))
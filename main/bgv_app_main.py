@@ -1,6 +1,7 @@
 import tkinter as tk
 
 from config.config import config
+from crypto.modulus_compatibility import shutdown_search_pool
 from gui.config_tab import ConfigurationTab
 from gui.operations_tab import OperationsTab
 from gui.styles import Styles
@@ -25,6 +26,8 @@ class BGVApp:
         # Setup UI
         self.setup_ui()
 
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+
     def setup_window(self):
         # Setup main window with config values
         
@@ -51,11 +54,13 @@ class BGVApp:
         self.lambda_security = config.bgv.LAMBDA_SECURITY
         self.plaintext_modulus = config.bgv.PLAINTEXT_MODULUS
         self.base = config.bgv.BASE
+        self.modulus_levels = config.bgv.MODULUS_LEVELS
         
         self.coef_modulus = None
         self.poly_modulus = None
         self.small_modulus = None
         self.delta = None
+        self.parameter_context = None
 
         self.sk = None
         self.pk0 = None
@@ -117,6 +122,13 @@ class BGVApp:
         self.notebook = ttk.Notebook(parent)
         LayoutHelper.pack_configure(self.notebook, fill='both', expand=True)
 
+    def on_close(self):
+        # Stop worker pools and free shared key memory before closing
+        if self.operation_handler is not None:
+            self.operation_handler.shutdown()
+        shutdown_search_pool()
+        self.root.destroy()
+
     def reset_application_state(self):
         # Reset application state for new key generation
         
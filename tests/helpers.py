@@ -0,0 +1,61 @@
+import io
+from contextlib import redirect_stdout
+
+import numpy as np
+
+from core.bgv import decrypt_ciphertext, gen_public_key, gen_secret_key, noise_polynomial
+from core.polynomial import QuotientRingPoly, init_poly_modulus
+from core.utils import infinity_norm
+from crypto.modulus_compatibility import generate_modulus_chain
+from crypto.operation_handler import OperationHandler
+
+
+def make_handler(n, plaintext_modulus, levels, **kwargs):
+    # Handler with tracked noise bounds over a fresh modulus chain
+    with redirect_stdout(io.StringIO()):
+        moduli, _ = generate_modulus_chain(128, plaintext_modulus, n, levels)
+    poly_modulus = init_poly_modulus(n)
+    sk = gen_secret_key(moduli[0], poly_modulus)
+    public_key = gen_public_key(sk, moduli[0], poly_modulus, plaintext_modulus)
+    return OperationHandler(sk, moduli[0], moduli[-1], poly_modulus, plaintext_modulus, 'auto',
+                            moduli=moduli, balanced_digits=True, public_key=public_key, **kwargs)
+
+
+def measured_noise(handler, ciphertext):
+    sk = handler.get_level_sk(ciphertext[0].coef_modulus)
+    return infinity_norm(noise_polynomial(tuple(ciphertext), sk).coef)
+
+
+def decrypted_values(handler, ciphertext):
+    # Plaintext coefficients in [0, t)
+    sk = handler.get_level_sk(ciphertext[0].coef_modulus)
+    msg = decrypt_ciphertext(tuple(ciphertext), sk, handler.plaintext_modulus)
+    return np.asarray(msg.coef, dtype=object) % handler.plaintext_modulus
+
+
+def squared_values(handler, values):
+    # Plaintext square of the coefficient values in the ring mod t
+    msg = QuotientRingPoly(values, handler.plaintext_modulus, handler.poly_modulus)
+    return np.asarray((msg * msg).coef, dtype=object) % handler.plaintext_modulus
+
+
+def square_chain(handler, plaintext, steps, level=0):
+    # Encrypt plaintext at level and square it up to `steps` times as the operations tab
+    # does (scheduled switching, product, result switching). After every squaring each
+    # stored ciphertext must stay under its tracked bound and the result must decrypt to
+    # the plaintext square. Stops at the first blocked product; returns the squarings done.
+    values = {'R0': handler.encrypt_at_level(plaintext, level)}
+    for step in range(1, steps + 1):
+        operand, name = f"R{step - 1}", f"R{step}"
+        handler.apply_scheduled_switching(operand, '*', operand, values)
+        result, success, _ = handler.perform_operation(operand, '*', operand, values)
+        if not success:
+            return step - 1
+        values[name] = result
+        handler.apply_result_switching(name, result, values)
+
+        for stored, ciphertext in values.items():
+            assert ciphertext.noise_estimate >= measured_noise(handler, ciphertext), (step, stored)
+        plaintext = squared_values(handler, plaintext)
+        assert (decrypted_values(handler, values[name]) == plaintext).all(), step
+    return steps
@@ -0,0 +1,54 @@
+import random
+
+import numpy as np
+import pytest
+
+from core.ciphertext import Ciphertext
+from crypto.noise_management import decrypt_cached
+from helpers import make_handler
+
+
+def test_cached_value_is_computed_once_per_version():
+    ciphertext = Ciphertext(('c0', 'c1'), noise_estimate=5)
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return len(calls)
+
+    assert ciphertext.cached('value', compute) == 1
+    assert ciphertext.cached('value', compute) == 1
+
+    # A derived ciphertext is a new version with an empty cache
+    derived = ciphertext.derive(('d0', 'd1', 'd2'), noise_estimate=9)
+    assert derived.version > ciphertext.version
+    assert derived.cached('value', compute) == 2
+    assert (len(derived), derived.noise_estimate) == (3, 9)
+    assert ciphertext.cached('value', compute) == 1
+
+
+def test_ciphertext_is_immutable():
+    ciphertext = Ciphertext(('c0', 'c1'))
+    with pytest.raises(AttributeError):
+        ciphertext.noise_estimate = 1
+    assert Ciphertext.wrap(ciphertext) is ciphertext
+    assert Ciphertext.wrap(('c0', 'c1')).noise_estimate is None
+
+
+def test_relinearization_invalidates_cached_plaintext():
+    random.seed(2)
+    np.random.seed(2)
+    handler = make_handler(16, 7, 3)
+    values = {'A': handler.encrypt_at_level([random.randrange(7) for _ in range(16)])}
+    result, success, _ = handler.perform_operation('A', '*', 'A', values)
+    assert success
+    values['R'] = result
+    before = decrypt_cached(result, handler.sk, 7)
+    assert decrypt_cached(result, handler.sk, 7) is before
+
+    relinearized = handler.relinearize_stored('R', values)
+    assert relinearized.version != result.version
+    assert len(relinearized) == 2
+    after = decrypt_cached(relinearized, handler.get_level_sk(relinearized.coef_modulus), 7)
+    assert after is not before
+    assert (np.asarray(after[0].coef) % 7 == np.asarray(before[0].coef) % 7).all()
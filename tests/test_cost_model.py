@@ -0,0 +1,30 @@
+import io
+from contextlib import redirect_stdout
+
+import pytest
+
+from crypto.cost_model import recommend_base
+from crypto.modulus_compatibility import generate_modulus_chain
+
+
+@pytest.mark.parametrize('levels', [6, 8])
+def test_recommend_base_walks_the_chain(levels):
+    with redirect_stdout(io.StringIO()):
+        moduli, _ = generate_modulus_chain(128, 7, 16, levels)
+    recommendation = recommend_base(16, moduli[0], 7, depth=levels - 1, balanced=True, moduli=moduli)
+    estimates = recommendation['candidates']
+    feasible = [e for e in estimates if e['feasible']]
+
+    # Switching down the chain keeps the squarings under the critical threshold
+    assert feasible
+    assert recommendation['feasible']
+    assert recommendation['time_units'] == min(e['time_units'] for e in feasible)
+
+
+def test_recommend_base_keeps_fastest_when_nothing_fits():
+    with redirect_stdout(io.StringIO()):
+        moduli, _ = generate_modulus_chain(80, 7, 16, 2)
+    recommendation = recommend_base(16, moduli[0], 7, depth=20, moduli=moduli)
+
+    assert not any(e['feasible'] for e in recommendation['candidates'])
+    assert recommendation['time_units'] == min(e['time_units'] for e in recommendation['candidates'])
@@ -0,0 +1,49 @@
+import io
+import math
+from contextlib import redirect_stdout
+
+import pytest
+
+from crypto.modulus_compatibility import (generate_modulus_chain, sieve_progression, small_primes_below,
+                                          verify_prime_chain)
+
+
+def is_prime_by_trial_division(n):
+    return n > 1 and all(n % d for d in range(2, math.isqrt(n) + 1))
+
+
+@pytest.mark.parametrize('start, step', [
+    ((1 << 20) + 1, 2 * 16),
+    (1 + 3104 * 345_000, 3104),
+    (10 ** 9 + 7, 2 * 128 * 97),
+])
+def test_sieve_progression_keeps_exactly_the_primes(start, step):
+    # Candidates below 2^32 without a factor under 2^16 are the primes
+    window = 4096
+    survivors = set(sieve_progression(start, step, window).tolist())
+    expected = {k for k in range(window) if is_prime_by_trial_division(start + k * step)}
+    assert survivors == expected
+
+
+def test_sieve_progression_with_few_primes():
+    primes = small_primes_below(100)
+    start, step, window = 1001, 14, 500
+    survivors = set(sieve_progression(start, step, window, primes).tolist())
+    assert survivors == {k for k in range(window)
+                         if all((start + k * step) % p for p in primes.tolist())}
+
+
+def test_sieve_progression_common_factor():
+    # Every candidate is even
+    assert sieve_progression(1 << 20, 32, 1024).size == 0
+
+
+@pytest.mark.parametrize('n', [16, 64, 128])
+def test_chain_for_sparse_progression(n):
+    # λ=80, t=97, 8 levels: 18-bit primes ≡ 1 (mod lcm(2n, 97)) are too few for the chain
+    with redirect_stdout(io.StringIO()):
+        moduli, prime_chain = generate_modulus_chain(80, 97, n, 8)
+
+    assert len(moduli) == 8
+    assert all(upper % lower == 0 for upper, lower in zip(moduli, moduli[1:]))
+    assert verify_prime_chain(prime_chain, 97, n) == []
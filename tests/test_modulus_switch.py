@@ -0,0 +1,64 @@
+import io
+import random
+from contextlib import redirect_stdout
+
+import numpy as np
+import pytest
+
+from core.bgv import decrypt_ciphertext, encrypt, gen_public_key, gen_secret_key
+from core.modulus_switch import ModulusSwitchPlan
+from core.operations import mul
+from core.polynomial import QuotientRingPoly, init_poly_modulus
+from core.utils import mod_center
+from crypto.modulus_compatibility import generate_modulus_chain
+
+
+@pytest.mark.parametrize('plaintext_modulus', [2, 7, 97])
+def test_exact_division_keeps_coefficients_mod_t(plaintext_modulus):
+    random.seed(plaintext_modulus)
+    small_mod = (1 << 61) - 1
+    delta = (1 << 89) - 1
+    plan = ModulusSwitchPlan(delta * small_mod, small_mod, plaintext_modulus)
+    assert plan.method == 'advanced'
+
+    coefs = np.array([random.randrange(plan.big_mod) for _ in range(64)], dtype=object)
+    scaled = plan.scale_coefs(coefs)
+
+    # delta * scaled differs from the centered input by a multiple of t of at most t * delta / 2
+    difference = mod_center(scaled * delta - mod_center(coefs, plan.big_mod), plan.big_mod)
+    assert all(d % plaintext_modulus == 0 for d in difference)
+    assert all(abs(d) <= plaintext_modulus * delta // 2 for d in difference)
+    assert all(-small_mod // 2 <= c < small_mod - small_mod // 2 for c in scaled)
+
+
+def test_plan_falls_back_to_rounding():
+    # delta = 6 shares the factor 2 with t
+    assert ModulusSwitchPlan(6 * 101, 101, 2).method == 'simple'
+    with pytest.raises(ValueError):
+        ModulusSwitchPlan(1000, 7, 2)
+
+
+@pytest.mark.parametrize('multiply', [False, True])
+def test_switched_ciphertext_decrypts_to_same_plaintext(multiply):
+    random.seed(1)
+    np.random.seed(1)
+    n, plaintext_modulus = 16, 7
+    with redirect_stdout(io.StringIO()):
+        moduli, _ = generate_modulus_chain(128, plaintext_modulus, n, 3)
+    poly_modulus = init_poly_modulus(n)
+    sk = gen_secret_key(moduli[0], poly_modulus)
+    pk0, pk1 = gen_public_key(sk, moduli[0], poly_modulus, plaintext_modulus)
+    ciphertext = encrypt(QuotientRingPoly([random.randrange(plaintext_modulus) for _ in range(n)],
+                                          moduli[0], poly_modulus),
+                         pk0, pk1, moduli[0], poly_modulus, plaintext_modulus)
+    if multiply:
+        ciphertext = mul(*ciphertext, *ciphertext)
+    expected = decrypt_ciphertext(ciphertext, sk, plaintext_modulus).coef % plaintext_modulus
+
+    # Chain primes are ≡ 1 (mod t), so delta ≡ 1 and the plaintext is kept unchanged
+    for big_mod, small_mod in zip(moduli, moduli[1:]):
+        ciphertext = ModulusSwitchPlan(big_mod, small_mod, plaintext_modulus).scale_ciphertext(ciphertext)
+        level_sk = QuotientRingPoly(sk.coef, small_mod, poly_modulus)
+        actual = decrypt_ciphertext(ciphertext, level_sk, plaintext_modulus).coef % plaintext_modulus
+        assert len(ciphertext) == (3 if multiply else 2)
+        assert (actual == expected).all()
@@ -0,0 +1,21 @@
+import random
+
+import numpy as np
+import pytest
+
+from helpers import make_handler, square_chain
+
+
+@pytest.mark.parametrize('n, plaintext_modulus, policy, estimation', [
+    (16, 7, 'scheduled', 'heuristic'),
+    (128, 257, 'scheduled', 'heuristic'),
+    (64, 2, 'threshold', 'heuristic'),
+    (16, 7, 'threshold', 'worst_case'),
+])
+def test_bound_covers_squaring_chain(n, plaintext_modulus, policy, estimation):
+    random.seed(n + plaintext_modulus)
+    np.random.seed(n + plaintext_modulus)
+    handler = make_handler(n, plaintext_modulus, 4, switching_policy=policy, noise_estimation=estimation)
+    plaintext = [random.randrange(plaintext_modulus) for _ in range(n)]
+
+    assert square_chain(handler, plaintext, 15) >= 3
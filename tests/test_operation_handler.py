@@ -0,0 +1,28 @@
+import random
+
+import numpy as np
+import pytest
+
+from helpers import make_handler, square_chain
+
+
+# The ratio rule spends levels early, so it supports fewer squarings on the same chain
+@pytest.mark.parametrize('n, plaintext_modulus, policy, max_depth', [
+    (16, 7, 'scheduled', 6),
+    (64, 97, 'scheduled', 6),
+    (16, 7, 'threshold', 3),
+])
+def test_planned_level_decrypts_at_depth(n, plaintext_modulus, policy, max_depth):
+    random.seed(n)
+    np.random.seed(n)
+    handler = make_handler(n, plaintext_modulus, 8, switching_policy=policy)
+    levels = [handler.level_for_depth(depth) for depth in range(1, max_depth + 1)]
+
+    # The planned circuit, `depth` consecutive squarings, completes from the chosen level
+    for depth, level in enumerate(levels, 1):
+        plaintext = [random.randrange(plaintext_modulus) for _ in range(n)]
+        assert square_chain(handler, plaintext, depth, level) == depth, (depth, level)
+
+    # Shallow circuits start below the top of the chain
+    assert levels[0] > 0
+    assert levels == sorted(levels, reverse=True)
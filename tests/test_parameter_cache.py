@@ -0,0 +1,59 @@
+import io
+import json
+import os
+from contextlib import redirect_stdout
+
+import pytest
+
+from crypto import parameter_cache
+from crypto.modulus_compatibility import generate_modulus_chain
+from crypto.parameter_cache import (cache_path, create_parameter_context, load_parameter_context,
+                                    store_parameter_context)
+
+
+@pytest.fixture(scope='module')
+def context():
+    with redirect_stdout(io.StringIO()):
+        moduli, prime_chain = generate_modulus_chain(80, 7, 16, 3)
+    return create_parameter_context(16, 80, 7, moduli, prime_chain)
+
+
+def test_store_and_load_round_trip(context, tmp_path):
+    assert store_parameter_context(context, str(tmp_path))
+    assert load_parameter_context(16, 80, 7, 3, str(tmp_path)) == context
+
+    # Other configurations miss
+    assert load_parameter_context(16, 80, 7, 4, str(tmp_path)) is None
+    assert load_parameter_context(32, 80, 7, 3, str(tmp_path)) is None
+
+
+def test_version_mismatch_is_a_miss(context, tmp_path, monkeypatch):
+    assert store_parameter_context(context, str(tmp_path))
+    path = cache_path(*context.key(), cache_dir=str(tmp_path))
+
+    # An entry written by another version, found in this version's directory
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    data['version'] = parameter_cache.CACHE_VERSION - 1
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    assert load_parameter_context(16, 80, 7, 3, str(tmp_path)) is None
+
+    # A new version looks in its own directory
+    assert store_parameter_context(context, str(tmp_path))
+    monkeypatch.setattr(parameter_cache, 'CACHE_VERSION', parameter_cache.CACHE_VERSION + 1)
+    assert load_parameter_context(16, 80, 7, 3, str(tmp_path)) is None
+
+
+def test_tampered_entry_is_rejected(context, tmp_path):
+    assert store_parameter_context(context, str(tmp_path))
+    path = cache_path(*context.key(), cache_dir=str(tmp_path))
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    data['moduli'][1] += 2
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    assert load_parameter_context(16, 80, 7, 3, str(tmp_path)) is None
+
+    os.remove(path)
+    assert load_parameter_context(16, 80, 7, 3, str(tmp_path)) is None
@@ -0,0 +1,87 @@
+import random
+
+import numpy as np
+import pytest
+
+from core.bgv import decrypt_ciphertext, encrypt, gen_public_key, gen_secret_key
+from core.operations import mul
+from core.polynomial import QuotientRingPoly, init_poly_modulus, random_uniform_poly
+from core.relinearization import (accumulate_key_products, decomposition_values, gen_relinearization_key,
+                                  iter_digit_coefs, iter_digit_range, key_coefficients,
+                                  relinearization_digits, relinearize)
+
+COEF_MODULUS = (1 << 127) - 1
+BASES = [2, 3, 10, 16, 1 << 16]
+
+
+@pytest.mark.parametrize('balanced', [False, True])
+@pytest.mark.parametrize('base', BASES)
+def test_digits_round_trip(base, balanced):
+    poly = random_uniform_poly(COEF_MODULUS, init_poly_modulus(16))
+    digits = list(iter_digit_coefs(poly, base, balanced))
+    assert len(digits) == relinearization_digits(COEF_MODULUS, base, balanced)
+
+    # Digits in [0, base), or in [-(base // 2), base - 1 - base // 2] when balanced
+    low = -(base // 2) if balanced and base > 2 else 0
+    for digit in digits:
+        assert all(low <= d <= low + base - 1 for d in digit)
+
+    total = sum(digit * base**i for i, digit in enumerate(digits))
+    assert ((total - poly.coef) % COEF_MODULUS == 0).all()
+
+
+@pytest.mark.parametrize('balanced', [False, True])
+@pytest.mark.parametrize('base', BASES)
+def test_digit_ranges_match_full_decomposition(base, balanced):
+    poly = random_uniform_poly(COEF_MODULUS, init_poly_modulus(16))
+    values = decomposition_values(poly, base, balanced)
+    n_terms = relinearization_digits(COEF_MODULUS, base, balanced)
+    full = list(iter_digit_coefs(poly, base, balanced))
+
+    split = n_terms // 3
+    chunks = (list(iter_digit_range(values, base, balanced, 0, split))
+              + list(iter_digit_range(values, base, balanced, split, n_terms)))
+    assert all((chunk == digit).all() for chunk, digit in zip(chunks, full))
+    assert len(chunks) == len(full)
+
+
+@pytest.mark.parametrize('balanced', [False, True])
+def test_streamed_key_products_match_ring_products(balanced):
+    poly_modulus = init_poly_modulus(16)
+    base = 1 << 8
+    poly = random_uniform_poly(COEF_MODULUS, poly_modulus)
+    n_terms = relinearization_digits(COEF_MODULUS, base, balanced)
+    eks = [(random_uniform_poly(COEF_MODULUS, poly_modulus), random_uniform_poly(COEF_MODULUS, poly_modulus))
+           for _ in range(n_terms)]
+
+    acc0, acc1 = accumulate_key_products(iter_digit_coefs(poly, base, balanced), key_coefficients(eks))
+
+    digits = [QuotientRingPoly(digit, COEF_MODULUS, poly_modulus)
+              for digit in iter_digit_coefs(poly, base, balanced)]
+    expected0 = sum((digit * ek0 for digit, (ek0, _) in zip(digits, eks)), digits[0] * 0)
+    expected1 = sum((digit * ek1 for digit, (_, ek1) in zip(digits, eks)), digits[0] * 0)
+    assert (QuotientRingPoly(acc0, COEF_MODULUS, poly_modulus).coef == expected0.coef).all()
+    assert (QuotientRingPoly(acc1, COEF_MODULUS, poly_modulus).coef == expected1.coef).all()
+
+
+@pytest.mark.parametrize('balanced', [False, True])
+@pytest.mark.parametrize('base', [3, 16, 1 << 16])
+def test_relinearize_keeps_plaintext(base, balanced):
+    random.seed(base)
+    np.random.seed(base)
+    n, plaintext_modulus = 16, 7
+    poly_modulus = init_poly_modulus(n)
+    sk = gen_secret_key(COEF_MODULUS, poly_modulus)
+    pk0, pk1 = gen_public_key(sk, COEF_MODULUS, poly_modulus, plaintext_modulus)
+    ciphertexts = [encrypt(QuotientRingPoly([random.randrange(plaintext_modulus) for _ in range(n)],
+                                            COEF_MODULUS, poly_modulus),
+                           pk0, pk1, COEF_MODULUS, poly_modulus, plaintext_modulus)
+                   for _ in range(2)]
+    product = mul(*ciphertexts[0], *ciphertexts[1])
+
+    eks = gen_relinearization_key(sk, base, COEF_MODULUS, poly_modulus, plaintext_modulus, balanced)
+    relinearized = relinearize(*product, eks, base, COEF_MODULUS, poly_modulus, balanced)
+
+    expected = decrypt_ciphertext(product, sk, plaintext_modulus).coef % plaintext_modulus
+    actual = decrypt_ciphertext(relinearized, sk, plaintext_modulus).coef % plaintext_modulus
+    assert (actual == expected).all()
@@ -0,0 +1,41 @@
+import random
+
+import numpy as np
+import pytest
+
+from helpers import make_handler, square_chain
+
+
+@pytest.mark.parametrize('n, plaintext_modulus, levels', [
+    (16, 7, 6),
+    (16, 7, 8),
+    (64, 97, 6),
+])
+def test_scheduled_squaring_chain_decrypts(n, plaintext_modulus, levels):
+    random.seed(levels)
+    np.random.seed(levels)
+    handler = make_handler(n, plaintext_modulus, levels, switching_policy='scheduled')
+    plaintext = [random.randrange(plaintext_modulus) for _ in range(n)]
+
+    assert square_chain(handler, plaintext, 19) >= levels
+
+
+def test_held_product_keeps_margin():
+    random.seed(0)
+    handler = make_handler(128, 97, 8, switching_policy='scheduled', switching_margin_bits=12)
+    scheduler = handler.switching_scheduler
+    last_level = handler.num_levels - 1
+    fresh = handler.noise_estimator.fresh()
+
+    for _ in range(500):
+        left_level, right_level = random.randrange(last_level), random.randrange(last_level)
+        left_noise, right_noise = fresh << random.randrange(60), fresh << random.randrange(60)
+        level = scheduler.multiplication_level(left_noise, left_level, right_noise, right_level)
+        left = scheduler.switched_noise(left_noise, left_level, level)
+        right = scheduler.switched_noise(right_noise, right_level, level)
+        if left is None or right is None or level == last_level:
+            continue
+        # Held above the last level: within the margin, or no checked switch further down
+        assert (scheduler.within_margin(left, right, level)
+                or scheduler.switched_noise(left, level, level + 1) is None
+                or scheduler.switched_noise(right, level, level + 1) is None)